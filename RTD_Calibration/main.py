@@ -30,6 +30,10 @@ import sys
 import argparse
 from pathlib import Path
 import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
 
 # Añadir src al path una sola vez
 src_path = Path(__file__).parent / 'src'
@@ -40,7 +44,8 @@ if str(src_path) not in sys.path:
 from logfile import Logfile
 
 # Imports de utils - todos en un solo lugar
-from utils.config import load_config
+from utils.config import load_config, is_verbose, get_sets_config
+from utils.filtering import normalize_set_numbers
 from utils.tree_utils import create_tree_from_calibsets
 from utils.calibration_utils import calibrate_tree, export_calibration_details
 from utils.set_utils import create_calibration_set
@@ -63,6 +68,8 @@ def main():
     )
     parser.add_argument('--output', type=str, 
                        help='Ruta para el CSV de salida (default: data/results/calibration_constants_tree.csv)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Procesos para crear CalibSets en paralelo (default: 1 = secuencial)')
     
     args = parser.parse_args()
     
@@ -92,14 +99,16 @@ def main():
     print("="*80)
     
     config = load_config(str(config_path))
-    all_set_ids = sorted(config['sensors']['sets'].keys())
+    # Claves normalizadas a float: un set escrito como 3, '3' o 3.0 aparece una sola vez
+    sets_config = get_sets_config(config)
+    all_set_ids = sorted(sets_config)
     
     print(f"✓ Configuración cargada")
     print(f"  Total sets: {len(all_set_ids)}")
     
     # Contar por rondas
     rounds_count = {}
-    for set_info in config['sensors']['sets'].values():
+    for set_info in sets_config.values():
         try:
             r = int(set_info['round'])  # Asegurar que sea int
             rounds_count[r] = rounds_count.get(r, 0) + 1
@@ -124,7 +133,8 @@ def main():
     logfile_path = project_root / logfile_relative
     
     logfile_obj = Logfile(filepath=str(logfile_path))
-    logfile = logfile_obj.log_file
+    # CalibSetNumber numérico una sola vez, no en cada create_calibration_set
+    logfile = normalize_set_numbers(logfile_obj.log_file)
     print(f"✓ Logfile cargado: {len(logfile)} entradas")
     
     calibsets = {}
@@ -133,24 +143,40 @@ def main():
     
     print(f"\nProcesando {len(all_set_ids)} sets...")
     
-    for i, set_id in enumerate(all_set_ids, 1):
-        try:
-            # Usar create_calibration_set de utils - devuelve tupla (calibset, mean_offsets, std_offsets)
-            calibset, mean_offsets, std_offsets = create_calibration_set(
-                set_number=set_id,
-                logfile=logfile,
-                config=config
-            )
-            calibsets[set_id] = calibset  # Solo guardamos el CalibSet
-            
-            # Log cada 10 sets
-            if i % 10 == 0:
-                elapsed = time.time() - start_time
-                print(f"  Procesados: {i}/{len(all_set_ids)} sets ({elapsed:.1f}s)")
+    # Los sets son independientes: con --workers > 1 se reparten entre procesos
+    # y los resultados se recogen en el mismo orden (la salida puede intercalarse).
+    # El with cierra los procesos aunque el bucle se interrumpa con una excepción
+    parallel = args.workers > 1
+    with (ProcessPoolExecutor(max_workers=args.workers) if parallel else nullcontext()) as executor:
+        futures = {}
+        if parallel:
+            print(f"  Usando {args.workers} procesos")
+            futures = {
+                set_id: executor.submit(create_calibration_set, set_number=set_id, logfile=logfile, config=config)
+                for set_id in all_set_ids
+            }
         
-        except Exception as e:
-            failed_sets.append((set_id, str(e)))
-            print(f"  ✗ Set {set_id}: {e}")
+        for i, set_id in enumerate(all_set_ids, 1):
+            try:
+                # Usar create_calibration_set de utils - devuelve tupla (calibset, mean_offsets, std_offsets)
+                if parallel:
+                    calibset, mean_offsets, std_offsets = futures[set_id].result()
+                else:
+                    calibset, mean_offsets, std_offsets = create_calibration_set(
+                        set_number=set_id,
+                        logfile=logfile,
+                        config=config
+                    )
+                calibsets[set_id] = calibset  # Solo guardamos el CalibSet
+                
+                # Log cada 10 sets
+                if i % 10 == 0:
+                    elapsed = time.time() - start_time
+                    print(f"  Procesados: {i}/{len(all_set_ids)} sets ({elapsed:.1f}s)")
+            
+            except Exception as e:
+                failed_sets.append((set_id, str(e)))
+                print(f"  ✗ Set {set_id}: {e}")
     
     elapsed = time.time() - start_time
     
@@ -197,7 +223,8 @@ def main():
     df_results = calibrate_tree(
         tree=tree,
         reference_sensor_id=None,  # Usa reference del root
-        output_csv=str(output_path)
+        output_csv=str(output_path),
+        verbose=is_verbose(config)
     )
     
     # 4b. Exportar detalles de calibración (pasos intermedios)
@@ -238,20 +265,30 @@ def main():
     print(f"Error medio: {calculated['Error_K'].mean() * 1000:.3f} mK")
     print(f"Error std: {calculated['Error_K'].std() * 1000:.3f} mK")
     print(f"Caminos promedio: {calculated['N_Paths'].mean():.1f}")
-    print(f"SNR medio: {(calculated['Constante_Calibracion_K'].abs() / calculated['Error_K']).mean():.1f}")
+    # SNR solo sobre valores finitos: un Error_K = 0 daría inf y anularía la media
+    with np.errstate(divide='ignore', invalid='ignore'):
+        snr = np.abs(calculated['Constante_Calibracion_K'].to_numpy()) / calculated['Error_K'].to_numpy()
+    snr = snr[np.isfinite(snr)]
+    print(f"SNR medio: {snr.mean():.1f}" if snr.size else "SNR medio: N/A")
     
     # Tabla de constantes individuales
     print("\n--- Constantes Individuales (Primeros 20) ---")
     print(f"\n{'Sensor':<8} {'Set':<5} {'Constante (K)':<15} {'Error (mK)':<12} {'N_Paths':<10}")
     print("-"*70)
     
-    for _, row in calculated.head(20).iterrows():
-        sensor = int(row['Sensor'])
-        set_id = int(row['Set'])
-        const = row['Constante_Calibracion_K']
-        error = row['Error_K'] * 1000
-        n_paths = int(row['N_Paths'])
-        print(f"{sensor:<8} {set_id:<5} {const:<15.6f} {error:<12.3f} {n_paths:<10}")
+    # Columnas extraídas una vez como arrays (sin construir una Series por fila)
+    top = calculated.head(20)
+    table_rows = zip(
+        top['Sensor'].to_numpy(dtype=np.int64),
+        top['Set'].to_numpy(dtype=np.int64),
+        top['Constante_Calibracion_K'].to_numpy(dtype=np.float64),
+        top['Error_K'].to_numpy(dtype=np.float64) * 1000,
+        top['N_Paths'].to_numpy(dtype=np.int64),
+    )
+    print("\n".join(
+        f"{sensor:<8} {set_id:<5} {const:<15.6f} {error:<12.3f} {n_paths:<10}"
+        for sensor, set_id, const, error, n_paths in table_rows
+    ))
     
     if len(calculated) > 20:
         print(f"\n... y {len(calculated) - 20} sensores más (ver CSV)")
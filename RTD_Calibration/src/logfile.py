@@ -43,8 +43,10 @@ class Logfile:
                     raise FileNotFoundError(f"Logfile not found at '{self.filepath}'")
                 df = pd.read_csv(self.filepath)
 
-            # Normalizar nombres de columnas eliminando espacios en blanco
-            df = df.rename(columns=lambda c: c.strip())
+            # Normalizar nombres de columnas eliminando espacios en blanco.
+            # Se asigna un Index nuevo in-place (df ya es propio: copia o recién
+            # leído), en lugar de rename(), que volvería a copiar todos los datos
+            df.columns = pd.Index([c.strip() for c in df.columns])
             
             # Asegurar que existan las columnas esperadas, añadir con None si faltan
             expected = ["Filename", "Selection", "CalibSetNumber", "Date", "N_Run"]
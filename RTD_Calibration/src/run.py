@@ -24,7 +24,7 @@ class Run:
     Atributos:
         filename: str - Nombre del archivo (sin .txt)
         timestamps: pd.DatetimeIndex - Tiempos de medición
-        temperatures: pd.DataFrame - Temperaturas con columnas channel_1 a channel_14
+        temperatures: pd.DataFrame - Temperaturas (float32) con columnas channel_1 a channel_14
         reference_channel: int - Número de canal usado como referencia (1-14)
         offsets: dict[int, float] - {canal: offset} para canales válidos (1-14)
         offset_errors: dict[int, float] - {canal: error} error de cada offset
@@ -1,3 +1,5 @@
+import sys
+from collections import deque
 from typing import Dict, Optional, List
 try:
     from .tree_entry import TreeEntry
@@ -26,10 +28,27 @@ class Tree:
         self.entries: Dict[float, TreeEntry] = {}
         # Nodo raíz del árbol (normalmente R3 = ronda de referencia absoluta)
         self.root: Optional[TreeEntry] = None
+        # Caché de rondas {set_number: ronda} y el (root, versión de conexiones de
+        # TreeEntry) con que se calculó; add_entry/set_root la invalidan
+        self._rounds: Optional[Dict[float, int]] = None
+        self._rounds_root: Optional[TreeEntry] = None
+        self._rounds_version: int = -1
+        # Entries agrupadas por ronda {ronda: [entries]}, calculadas junto a _rounds
+        self._entries_by_round: Dict[int, List[TreeEntry]] = {}
     
     def add_entry(self, entry: TreeEntry):
         """Añade un TreeEntry al árbol usando su set_number como clave."""
         self.entries[entry.set_number] = entry
+        self.invalidate_rounds()
+    
+    def invalidate_rounds(self):
+        """
+        Descarta las rondas memorizadas; se recalculan en la siguiente consulta.
+        
+        add_entry, set_root y las conexiones con add_child/add_parent ya invalidan
+        solas. Solo hace falta llamarlo tras modificar children_entries a mano.
+        """
+        self._rounds = None
     
     def get_entry(self, set_number: float) -> Optional[TreeEntry]:
         """Obtiene un TreeEntry por su set_number. Devuelve None si no existe."""
@@ -60,36 +79,59 @@ class Tree:
             - R2 (ronda 2): Hijos directos del root
             - R1 (ronda 1): Nietos del root
         
-        Usa BFS (búsqueda en anchura) para calcular la distancia.
+        Usa BFS (búsqueda en anchura) para calcular la distancia; las rondas de
+        todas las entries se calculan en un solo BFS y se memorizan (ver _round_map).
+        """
+        return self._round_map().get(entry.set_number, 0)  # 0 = no conectado al root
+    
+    def get_entries_by_round(self, round_number: int) -> List[TreeEntry]:
+        """Devuelve todas las entradas de una ronda específica (calculada dinámicamente)."""
+        if not self._round_map():
+            # Sin root: ninguna entry está conectada (ronda 0)
+            return self.all_entries() if round_number == 0 else []
+        return list(self._entries_by_round.get(round_number, ()))
+    
+    def _round_map(self) -> Dict[float, int]:
+        """
+        Devuelve {set_number: ronda} para el root y todas las entries conectadas a él.
+        
+        Se recalcula solo si cambia la estructura: add_entry/set_root invalidan
+        la caché y cualquier add_child/add_parent incrementa la versión de
+        conexiones de TreeEntry (comprobación O(1) por consulta). Tras editar
+        children_entries a mano hay que llamar a invalidate_rounds().
         """
         if not self.root:
-            return 0
+            return {}
         
-        # Si es el root, es ronda 3
-        if entry == self.root:
-            return 3
+        # Identidad del root (no ==: TreeEntry es un dataclass y compararía campo a campo)
+        if (self._rounds is not None and self._rounds_root is self.root
+                and self._rounds_version == TreeEntry._links_version):
+            return self._rounds
         
-        # BFS (búsqueda en anchura) para calcular distancia al root
-        from collections import deque
+        # BFS (búsqueda en anchura) desde el root: R3 → R2 (hijos) → R1 (nietos)
+        # sobre las listas de adyacencia children_entries: O(entries + conexiones)
+        rounds = {self.root.set_number: 3}
         queue = deque([(self.root, 3)])  # (entry, ronda)
-        visited = {self.root.set_number}
         
         while queue:
             current, current_round = queue.popleft()
             
             # Revisar cada hijo del nodo actual
             for child in current.children_entries:
-                if child.set_number not in visited:
-                    visited.add(child.set_number)
-                    if child == entry:
-                        return current_round - 1  # Los hijos están una ronda abajo
+                if child.set_number not in rounds:
+                    rounds[child.set_number] = current_round - 1  # Los hijos están una ronda abajo
                     queue.append((child, current_round - 1))
         
-        return 0  # No conectado al root
-    
-    def get_entries_by_round(self, round_number: int) -> List[TreeEntry]:
-        """Devuelve todas las entradas de una ronda específica (calculada dinámicamente)."""
-        return [entry for entry in self.entries.values() if self.get_round(entry) == round_number]
+        # Clasificar las entries por ronda en la misma pasada (orden de self.entries)
+        entries_by_round = {}
+        for entry in self.entries.values():
+            entries_by_round.setdefault(rounds.get(entry.set_number, 0), []).append(entry)
+        
+        self._rounds = rounds
+        self._rounds_root = self.root
+        self._rounds_version = TreeEntry._links_version
+        self._entries_by_round = entries_by_round
+        return rounds
     
     def __repr__(self) -> str:
         root_str = f"{self.root.set_number}" if self.root else "None"
@@ -101,8 +143,15 @@ class Tree:
             print("Tree is empty")
             return
         
+        # Se acumulan todas las líneas y se escriben de una vez (una sola escritura
+        # a stdout en lugar de un print por nodo)
+        lines = []
+        
         def _print_node(node: TreeEntry, level=0):
             indent = "  " * level
-            print(f"{indent}- Set {node.set_number}, valid_sensors: {[s.id for s in node.get_valid_sensors()]}")
+            lines.append(f"{indent}- Set {node.set_number}, valid_sensors: {[s.id for s in node.get_valid_sensors()]}")
             for child in node.children_entries:
                 _print_node(child, level + 1)
+        
+        _print_node(self.root)
+        sys.stdout.write("\n".join(lines) + "\n")
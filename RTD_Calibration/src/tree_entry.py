@@ -28,6 +28,9 @@ try:
 except ImportError:
     from run import Run
 
+# Diccionario vacío compartido para búsquedas sin resultado (no se modifica nunca)
+_NO_OFFSETS: Dict[Sensor, Tuple[float, float]] = {}
+
 @dataclass
 class TreeEntry:
     """
@@ -65,6 +68,10 @@ class TreeEntry:
     # Offsets de sensores de ESTE entry hacia sus raised
     # Calculados de calibset.runs usando índice directo (sensors[canal-1])
     offsets_to_raised: Dict[Sensor, Dict[Sensor, Tuple[float, float]]] = field(default_factory=dict)
+    
+    # Contador global de cambios en conexiones parent/child (add_parent, add_child):
+    # el Tree lo compara para saber si sus rondas memorizadas siguen valiendo
+    _links_version = 0
 
     def __repr__(self) -> str:
         return f"TreeEntry(Set {self.calibset.set_number}, {len(self.discarded_sensors)} discarded, {len(self.calibset.runs)} runs)"
@@ -76,6 +83,7 @@ class TreeEntry:
         """
         if parent not in self.parent_entries:
             self.parent_entries.append(parent)
+            TreeEntry._links_version += 1
     
     def add_child(self, child: 'TreeEntry'):
         """
@@ -84,6 +92,7 @@ class TreeEntry:
         """
         if child not in self.children_entries:
             self.children_entries.append(child)
+            TreeEntry._links_version += 1
     
     def get_offset_to_raised(self, sensor: Sensor, raised: Sensor) -> Optional[Tuple[float, float]]:
         """
@@ -100,11 +109,15 @@ class TreeEntry:
             offset, error = entry.get_offset_to_raised(sensor_48178, raised_48060)
             # Devuelve cuánto difiere 48178 respecto a 48060 en este set
         """
-        return self.offsets_to_raised.get(raised, {}).get(sensor)
+        # offsets_to_raised ya es la tabla materializada {raised: {sensor: (offset, error)}}:
+        # dos búsquedas O(1), sin crear un dict vacío cuando el raised no existe
+        return self.offsets_to_raised.get(raised, _NO_OFFSETS).get(sensor)
     
     def get_valid_sensors(self) -> List[Sensor]:
         """Devuelve los objetos Sensor válidos (no descartados)."""
-        return [s for s in self.calibset.sensors if s not in self.discarded_sensors]
+        # Descartados como set, resuelto una vez por llamada: pertenencia O(1) por sensor
+        discarded = set(self.discarded_sensors)
+        return [s for s in self.calibset.sensors if s not in discarded]
     
     def is_sensor_discarded(self, sensor: Sensor) -> bool:
         """Verifica si un sensor está descartado."""
@@ -7,7 +7,8 @@ Funciones principales:
 - calibrate_tree(): Función principal que calcula constantes finales
 """
 
-from typing import List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Optional
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -19,13 +20,229 @@ if str(parent_dir) not in sys.path:
 
 from tree_entry import TreeEntry
 from tree import Tree
-from utils.math_utils import propagate_error
+
+
+def _write_table(df: pd.DataFrame, output_path: str) -> str:
+    """
+    Escribe un DataFrame según la extensión de output_path.
+    
+    Formatos y paquete opcional que necesita cada uno:
+        - .parquet (zstd) y .feather: pyarrow. Binarios columnares, mucho más
+          rápidos de escribir y leer que CSV para tablas grandes
+        - .xlsx: openpyxl, en modo write-only (sin estilos por celda)
+        - cualquier otra extensión: CSV (solo pandas)
+    
+    Returns:
+        Nombre del formato escrito (ej: 'Parquet')
+    
+    Raises:
+        ImportError: Si falta el paquete que necesita el formato pedido
+    """
+    suffix = Path(output_path).suffix.lower()
+    writers = {
+        '.parquet': ('Parquet', 'pyarrow', lambda: df.to_parquet(output_path, index=False, compression='zstd')),
+        '.feather': ('Feather', 'pyarrow', lambda: df.reset_index(drop=True).to_feather(output_path)),
+        '.xlsx': ('Excel', 'openpyxl', lambda: _write_excel_fast(df, output_path)),
+    }
+    if suffix not in writers:
+        df.to_csv(output_path, index=False)
+        return 'CSV'
+    
+    fmt, package, write = writers[suffix]
+    try:
+        write()
+    except ImportError as e:
+        raise ImportError(
+            f"Exportar a {fmt} ({output_path}) requiere '{package}': instálalo o usa una ruta .csv"
+        ) from e
+    return fmt
+
+
+def _write_excel_fast(df: pd.DataFrame, output_path: str) -> None:
+    """Escribe df en una hoja .xlsx con openpyxl write-only (NaN como celda vacía)."""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(df.columns))
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        sheet.append(row)
+    workbook.save(output_path)
+
+
+@dataclass
+class _PathIndex:
+    """
+    Datos del tree que find_all_paths_to_reference consulta en cada camino,
+    precalculados una vez para todos los sensores de una calibración.
+    """
+    r2_entries: List[TreeEntry]
+    r3_entries: List[TreeEntry]
+    # Índice inverso {sensor: entries de R2 que lo contienen}, en el orden de r2_entries
+    r2_by_sensor: Dict['Sensor', List[TreeEntry]]
+    # Último salto (puente R2 → R3) ya resuelto para cada sensor de R3:
+    # {sensor: [(entry_r3, reference_id, offset_3, error_3)]}, en el orden de r3_entries.
+    # Es idéntico para todos los sensores de R1 que llegan al mismo raised de R2.
+    r3_steps: Dict['Sensor', List[Tuple[TreeEntry, Optional[int], float, float]]]
+    # Tramos raised_r1 → referencia ya encadenados, rellenado bajo demanda por _upper_paths
+    upper_paths: Dict['Sensor', Tuple[np.ndarray, np.ndarray, list, list]] = field(default_factory=dict)
+    # Raised de cada set de R1 que sí llegan a la referencia, con los offsets del set
+    # hacia ellos y sus tramos: {set_number: [(raised_r1, {sensor: (offset, error)},
+    # offsets, errores², tramos, pasos)]}, rellenado por _bridges
+    bridges: Dict[float, list] = field(default_factory=dict)
+
+
+def _entries_by_sensor(entries: List[TreeEntry]) -> Dict['Sensor', List[TreeEntry]]:
+    """Índice inverso {sensor: [entries que lo contienen]} conservando el orden de entries."""
+    by_sensor = {}
+    for entry in entries:
+        # frozenset: un sensor repetido en un set no duplica el entry
+        for sensor in frozenset(entry.calibset.sensors):
+            by_sensor.setdefault(sensor, []).append(entry)
+    return by_sensor
+
+
+def _reference_steps(r3_entries: List[TreeEntry]) -> Dict['Sensor', List[Tuple[TreeEntry, Optional[int], float, float]]]:
+    """
+    Offset de cada sensor de R3 hasta la referencia de su set: {sensor: [(entry_r3, reference_id, offset, error)]}.
+    
+    Solo incluye los sensores que son la referencia (offset 0) o tienen offset calculado.
+    """
+    steps = {}
+    for entry_r3 in r3_entries:
+        calibset = entry_r3.calibset
+        # Obtener referencia del R3 (primer sensor de reference_sensors)
+        reference_id = calibset.reference_sensors[0].id if calibset.reference_sensors else None
+        for sensor in frozenset(calibset.sensors):
+            # Offset sensor → reference
+            if sensor.id == reference_id:
+                step = (entry_r3, reference_id, 0.0, 0.0)
+            elif sensor.id in calibset.mean_offsets:
+                step = (entry_r3, reference_id, calibset.mean_offsets[sensor.id], calibset.std_offsets.get(sensor.id, 0.0))
+            else:
+                continue
+            steps.setdefault(sensor, []).append(step)
+    return steps
+
+
+def _build_path_index(tree: Tree) -> _PathIndex:
+    """Construye el _PathIndex de un tree (rondas 2 y 3, índice sensor → entries de R2 y puentes a R3)."""
+    r2_entries = tree.get_entries_by_round(2)
+    r3_entries = tree.get_entries_by_round(3)
+    return _PathIndex(r2_entries, r3_entries, _entries_by_sensor(r2_entries), _reference_steps(r3_entries))
+
+
+def _upper_paths(
+    raised_r1: 'Sensor',
+    path_index: _PathIndex
+) -> Tuple[np.ndarray, np.ndarray, list, List[Tuple[float, float, float, float]]]:
+    """
+    Tramos raised_r1 → raised_r2 → referencia de todos los caminos que suben por raised_r1.
+    
+    Returns:
+        Tupla (offsets, errores², tramos, pasos): offsets y errores al cuadrado
+        acumulados de los pasos 2 y 3, [(entry_r2, raised_r2), (entry_r3, reference_id)]
+        de cada camino y sus (offset_2, error_2, offset_3, error_3) por separado.
+        Se calcula una vez por raised_r1 y se guarda en path_index.upper_paths
+    """
+    cached = path_index.upper_paths.get(raised_r1)
+    if cached is not None:
+        return cached
+    
+    offsets = []
+    errors_sq = []
+    tails = []
+    steps = []
+    
+    # Paso 2: Buscar en qué entry de R2 (Ronda 2) aparece el raised_r1
+    # El raised de R1 debe estar también en algún set de R2 para poder subir
+    # (búsqueda directa en el índice inverso, sin recorrer todos los sets de R2)
+    for entry_r2 in path_index.r2_by_sensor.get(raised_r1, ()):
+        # Paso 3: Desde raised_r1 (ahora en R2), subir a un raised de R2
+        # (un set sin raised o sin offsets simplemente no aporta tramos)
+        offsets_r2 = entry_r2.offsets_to_raised
+        for raised_r2 in entry_r2.raised_sensors:
+            # Un sensor no puede usar su propio offset (sería 0)
+            if raised_r2 == raised_r1:
+                continue
+            
+            # Calcular offset de raised_r1 hasta raised_r2 (segundo salto)
+            to_raised_r2 = offsets_r2.get(raised_r2)
+            offset_step2 = to_raised_r2.get(raised_r1) if to_raised_r2 else None
+            
+            if offset_step2 is None:
+                continue
+            
+            offset_2, error_2 = offset_step2
+            
+            # Paso 4: Desde raised_r2, subir hasta la referencia absoluta en R3
+            # R3 es la ronda final que contiene la referencia absoluta del experimento
+            # (puentes raised_r2 → referencia precalculados en el índice)
+            for entry_r3, reference_id, offset_3, error_3 in path_index.r3_steps.get(raised_r2, ()):
+                offsets.append(offset_2 + offset_3)
+                errors_sq.append(error_2 * error_2 + error_3 * error_3)
+                tails.append([(entry_r2, raised_r2), (entry_r3, reference_id)])
+                steps.append((offset_2, error_2, offset_3, error_3))
+    
+    cached = (np.asarray(offsets, dtype=np.float64), np.asarray(errors_sq, dtype=np.float64), tails, steps)
+    path_index.upper_paths[raised_r1] = cached
+    return cached
+
+
+def _bridges(start_entry: TreeEntry, path_index: _PathIndex) -> list:
+    """
+    Raised de start_entry con offsets en el set y al menos un camino hasta la referencia.
+    
+    Returns:
+        Lista [(raised_r1, offsets_to_raised[raised_r1], offsets, errores², tramos, pasos)] en el
+        orden de raised_sensors (ver _upper_paths). La topología es fija, así que se
+        calcula una vez por set y se guarda en path_index.bridges: a cada sensor solo
+        le queda buscar su offset del paso 1
+    """
+    bridges = path_index.bridges.get(start_entry.set_number)
+    if bridges is None:
+        bridges = []
+        for raised_r1 in start_entry.raised_sensors:
+            to_raised_r1 = start_entry.offsets_to_raised.get(raised_r1)
+            if not to_raised_r1:
+                continue
+            offsets_23, errors_23_sq, tails, steps = _upper_paths(raised_r1, path_index)
+            if tails:
+                bridges.append((raised_r1, to_raised_r1, offsets_23, errors_23_sq, tails, steps))
+        path_index.bridges[start_entry.set_number] = bridges
+    return bridges
+
+
+def _sensor_routes(sensor: 'Sensor', start_entry: TreeEntry, path_index: _PathIndex):
+    """
+    Recorrido común de find_all_paths_to_reference, _path_totals y export_calibration_details.
+    
+    Genera, para cada raised de start_entry que conecta con R3 (ver _bridges), la
+    tupla (raised_r1, offset_1, error_1, offsets, errores², tramos, pasos): el paso 1
+    del sensor hasta raised_r1 y los pasos 2-4 ya encadenados, que solo dependen de
+    raised_r1 y se comparten entre todos los sensores que suben por él. Cada
+    llamador decide qué calcula con ellos.
+    """
+    for raised_r1, to_raised_r1, offsets_23, errors_23_sq, tails, steps in _bridges(start_entry, path_index):
+        # Un sensor no puede usar su propio offset (sería 0)
+        if raised_r1 == sensor:
+            continue
+        
+        # Paso 1: Calcular offset del sensor hasta el raised de R1
+        # (mismo resultado que get_offset_to_raised, con el dict del raised ya resuelto)
+        offset_step1 = to_raised_r1.get(sensor)
+        if offset_step1 is None:
+            continue
+        
+        offset_1, error_1 = offset_step1
+        yield raised_r1, offset_1, error_1, offsets_23, errors_23_sq, tails, steps
 
 
 def find_all_paths_to_reference(
     sensor: 'Sensor',
     start_entry: TreeEntry,
-    tree: Tree
+    tree: Tree,
+    path_index: Optional[_PathIndex] = None
 ) -> List[Tuple[float, float, List[Tuple[TreeEntry, 'Sensor']]]]:
     """
     Encuentra TODOS los caminos desde un sensor hasta la referencia.
@@ -34,6 +251,8 @@ def find_all_paths_to_reference(
         sensor: Objeto Sensor de origen (típicamente en R1)
         start_entry: TreeEntry donde está el sensor
         tree: Tree completo
+        path_index: Índice precalculado del tree (None = se construye aquí; para
+            varios sensores conviene construirlo una vez con _build_path_index)
     
     Returns:
         Lista de tuplas (offset_total, error_total, path_details)
@@ -48,86 +267,68 @@ def find_all_paths_to_reference(
     if start_entry.is_sensor_discarded(sensor):
         return paths
     
-    # Obtener raised disponibles para este sensor
-    available_raised = start_entry.get_raised_for_sensor(sensor)
+    if path_index is None:
+        path_index = _build_path_index(tree)
     
-    if not available_raised:
-        return paths
-    
-    # Para cada raised en R1, buscar caminos hacia R3
-    for raised_r1 in available_raised:
-        # Paso 1: Calcular offset del sensor hasta el raised de R1
-        # Esto nos da cuánto difiere el sensor respecto al raised
-        offset_step1 = start_entry.get_offset_to_raised(sensor, raised_r1)
+    # Para cada raised en R1 que conecta con R3, con el offset del sensor hasta él
+    for raised_r1, offset_1, error_1, offsets_23, errors_23_sq, tails, _ in _sensor_routes(sensor, start_entry, path_index):
+        # Encadenar los tres offsets para todos los caminos a la vez
+        # offset_total = (sensor → raised_r1) + (raised_r1 → raised_r2) + (raised_r2 → referencia)
+        total_offsets = offset_1 + offsets_23
+        total_errors = np.sqrt(error_1 * error_1 + errors_23_sq)
         
-        if offset_step1 is None:
-            continue
-        
-        offset_1, error_1 = offset_step1
-        
-        # Paso 2: Buscar en qué entry de R2 (Ronda 2) aparece el raised_r1
-        # El raised de R1 debe estar también en algún set de R2 para poder subir
-        r2_entries = tree.get_entries_by_round(2)
-        
-        for entry_r2 in r2_entries:
-            # Verificar si este entry de R2 contiene el raised_r1
-            if raised_r1 not in entry_r2.calibset.sensors:
-                continue
-            
-            # Paso 3: Desde raised_r1 (ahora en R2), subir a un raised de R2
-            available_raised_r2 = entry_r2.get_raised_for_sensor(raised_r1)
-            
-            if not available_raised_r2:
-                continue
-            
-            for raised_r2 in available_raised_r2:
-                # Calcular offset de raised_r1 hasta raised_r2 (segundo salto)
-                offset_step2 = entry_r2.get_offset_to_raised(raised_r1, raised_r2)
-                
-                if offset_step2 is None:
-                    continue
-                
-                offset_2, error_2 = offset_step2
-                
-                # Paso 4: Desde raised_r2, subir hasta la referencia absoluta en R3
-                # R3 es la ronda final que contiene la referencia absoluta del experimento
-                r3_entries = tree.get_entries_by_round(3)
-                
-                for entry_r3 in r3_entries:
-                    if raised_r2 not in entry_r3.calibset.sensors:
-                        continue
-                    
-                    # Obtener referencia del R3 (primer sensor de reference_sensors)
-                    reference_id = entry_r3.calibset.reference_sensors[0].id if entry_r3.calibset.reference_sensors else None
-                    
-                    # Offset raised_r2 → reference
-                    if raised_r2.id == reference_id:
-                        offset_3 = 0.0
-                        error_3 = 0.0
-                    elif raised_r2.id in entry_r3.calibset.mean_offsets:
-                        offset_3 = entry_r3.calibset.mean_offsets[raised_r2.id]
-                        error_3 = entry_r3.calibset.std_offsets.get(raised_r2.id, 0.0)
-                    else:
-                        continue
-                    
-                    # Encadenar los tres offsets para obtener el offset total
-                    # offset_total = (sensor → raised_r1) + (raised_r1 → raised_r2) + (raised_r2 → referencia)
-                    total_offset = offset_1 + offset_2 + offset_3
-                    total_error = propagate_error(error_1, error_2, error_3)
-                    
-                    # Guardar información del camino completo
-                    path_details = [
-                        (start_entry, raised_r1),
-                        (entry_r2, raised_r2),
-                        (entry_r3, reference_id)
-                    ]
-                    
-                    # Añadir este camino a la lista de caminos válidos
-                    paths.append((total_offset, total_error, path_details))
+        # Guardar información del camino completo
+        for total_offset, total_error, tail in zip(total_offsets.tolist(), total_errors.tolist(), tails):
+            paths.append((total_offset, total_error, [(start_entry, raised_r1), *tail]))
     
     return paths
 
 
+def _path_totals(
+    sensor: 'Sensor',
+    start_entry: TreeEntry,
+    path_index: _PathIndex,
+    max_error_ratio: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Offsets y errores totales de todos los caminos de un sensor, sin path_details.
+    
+    Mismos caminos y en el mismo orden que find_all_paths_to_reference, para quien
+    solo necesita los números (calibrate_tree): no construye una lista de pasos
+    por camino. El sensor no debe estar descartado (se comprueba fuera).
+    
+    Con max_error_ratio se descartan los caminos con error mayor que
+    max_error_ratio × el menor error del sensor (peso < 1/max_error_ratio² del
+    mejor camino). Un raised cuyo mejor tramo ya supera el corte no se evalúa.
+    """
+    offsets_parts = []
+    errors_parts = []
+    best_error_sq = np.inf
+    cutoff_sq = max_error_ratio * max_error_ratio if max_error_ratio is not None else None
+    for _, offset_1, error_1, offsets_23, errors_23_sq, _, _ in _sensor_routes(sensor, start_entry, path_index):
+        error_1_sq = error_1 * error_1
+        if cutoff_sq is not None:
+            # Error² mínimo posible por este raised: si ya supera el corte, ningún camino entra
+            min_error_sq = error_1_sq + errors_23_sq.min()
+            if min_error_sq > cutoff_sq * best_error_sq:
+                continue
+            best_error_sq = min(best_error_sq, min_error_sq)
+        
+        offsets_parts.append(offset_1 + offsets_23)
+        errors_parts.append(np.sqrt(error_1_sq + errors_23_sq))
+    
+    if not offsets_parts:
+        return np.empty(0), np.empty(0)
+    offsets = np.concatenate(offsets_parts)
+    errors = np.concatenate(errors_parts)
+    
+    if cutoff_sq is not None:
+        # Corte final respecto al mejor camino de todos (el de arriba es sobre la marcha)
+        keep = errors * errors <= cutoff_sq * best_error_sq
+        offsets, errors = offsets[keep], errors[keep]
+    return offsets, errors
+
+
 def weighted_average_paths(
     paths: List[Tuple[float, float, any]]
 ) -> Tuple[Optional[float], Optional[float]]:
@@ -157,30 +358,129 @@ def weighted_average_paths(
     if len(paths) == 1:
         return paths[0][0], paths[0][1]
     
-    # Extraer los offsets y errores de todos los caminos
-    offsets = np.array([p[0] for p in paths])
-    errors = np.array([p[1] for p in paths])
+    # Extraer los offsets y errores de todos los caminos (sin listas intermedias)
+    n_paths = len(paths)
+    offsets = np.fromiter((p[0] for p in paths), dtype=np.float64, count=n_paths)
+    errors = np.fromiter((p[1] for p in paths), dtype=np.float64, count=n_paths)
     
+    return _weighted_average(offsets, errors)
+
+
+def _weighted_average(offsets: np.ndarray, errors: np.ndarray) -> Tuple[float, float]:
+    """Media ponderada 1/σ² de arrays de offsets y errores (al menos dos caminos)."""
     # Calcular pesos para la media ponderada: peso = 1/error²
     # Los caminos con menor error tienen más peso (son más confiables)
-    # Evitar división por cero usando un valor muy pequeño
-    errors_safe = np.where(errors == 0, 1e-10, errors)
-    weights = 1.0 / (errors_safe ** 2)
+    # Evitar división por cero usando un valor muy pequeño (error 1e-10 → error² 1e-20)
+    # Todo sobre un único buffer, sin arrays temporales intermedios
+    weights = np.square(errors)
+    weights[errors == 0] = 1e-20
+    np.reciprocal(weights, out=weights)
+    sum_weights = weights.sum()
     
-    # Calcular la media ponderada: suma(peso * offset) / suma(pesos)
-    weighted_mean = np.sum(weights * offsets) / np.sum(weights)
+    # Calcular la media ponderada: suma(peso * offset) / suma(pesos), como producto escalar
+    weighted_mean = float(weights @ offsets) / sum_weights
     
     # Calcular el error propagado: 1 / raíz(suma de pesos)
     # Esto da un error menor cuando hay más caminos (más información)
-    propagated_error = 1.0 / np.sqrt(np.sum(weights))
+    propagated_error = 1.0 / np.sqrt(sum_weights)
     
     return weighted_mean, propagated_error
 
 
+def _weighted_average_groups(
+    offsets: np.ndarray,
+    errors: np.ndarray,
+    counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Media ponderada 1/σ² de varios grupos de caminos a la vez.
+    
+    Args:
+        offsets, errors: Caminos de todos los grupos, concatenados en orden
+        counts: Número de caminos de cada grupo (>= 1)
+    
+    Returns:
+        Tupla (medias, errores) con un valor por grupo. Con bincount por grupo, sin
+        bucle Python; los grupos de un solo camino conservan su offset y error
+        (igual que weighted_average_paths)
+    """
+    n_groups = counts.size
+    groups = np.repeat(np.arange(n_groups), counts)
+    
+    # Mismos pesos que _weighted_average: 1/error², con error 0 → 1e-10
+    weights = np.square(errors)
+    weights[errors == 0] = 1e-20
+    np.reciprocal(weights, out=weights)
+    
+    sum_weights = np.bincount(groups, weights=weights, minlength=n_groups)
+    means = np.bincount(groups, weights=weights * offsets, minlength=n_groups) / sum_weights
+    propagated = 1.0 / np.sqrt(sum_weights)
+    
+    # Un solo camino: su offset y error tal cual
+    single = counts == 1
+    if single.any():
+        first = np.cumsum(counts) - counts
+        means[single] = offsets[first[single]]
+        propagated[single] = errors[first[single]]
+    
+    return means, propagated
+
+
+_RESULT_COLUMNS = ('Sensor', 'Set', 'Round', 'Constante_Calibracion_K', 'Error_K', 'N_Paths', 'Status')
+
+
+def _allocate_result_columns(n_rows: int, sensor_dtype=np.int64) -> Dict[str, np.ndarray]:
+    """Reserva los arrays de las columnas de calibrate_tree para n_rows filas."""
+    return {
+        'Sensor': np.empty(n_rows, dtype=sensor_dtype),
+        'Set': np.empty(n_rows, dtype=np.float64),
+        'Round': np.empty(n_rows, dtype=np.int64),
+        'Constante_Calibracion_K': np.empty(n_rows, dtype=np.float64),
+        'Error_K': np.empty(n_rows, dtype=np.float64),
+        'N_Paths': np.empty(n_rows, dtype=np.int64),
+        'Status': np.empty(n_rows, dtype=object),
+    }
+
+
+def _write_record(
+    columns: Dict[str, np.ndarray],
+    k: int,
+    sensor_id,
+    set_number: float,
+    round_number: int,
+    offset: float,
+    error: float,
+    n_paths: int,
+    status: str
+) -> None:
+    """Escribe la fila k de las columnas de resultados (en el orden de _RESULT_COLUMNS)."""
+    for name, value in zip(_RESULT_COLUMNS, (sensor_id, set_number, round_number, offset, error, n_paths, status)):
+        columns[name][k] = value
+
+
+# Prioridad al quedarse con una fila por sensor (menor = preferida)
+_STATUS_PRIORITY = {'Calculado': 0, 'Referencia': 1, 'Descartado': 2, 'Sin conexión': 3}
+
+
+def _drop_duplicate_sensors(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja una fila por sensor según _STATUS_PRIORITY y, a igual estado, el menor Error_K.
+    
+    Un solo sort estable + drop_duplicates, sin agrupar en Python.
+    """
+    # Status es categórica con las categorías en el orden de _STATUS_PRIORITY: su código es la prioridad
+    priority = df['Status'].cat.codes
+    order = df.assign(_pri=priority).sort_values(['_pri', 'Error_K'], kind='stable').index
+    return df.loc[order].drop_duplicates('Sensor', keep='first')
+
+
 def calibrate_tree(
     tree: Tree,
     reference_sensor_id: Optional[int] = None,
-    output_csv: Optional[str] = None
+    output_csv: Optional[str] = None,
+    verbose: bool = True,
+    deduplicate: bool = False,
+    max_error_ratio: Optional[float] = None
 ) -> pd.DataFrame:
     """
     Calcula constantes de calibración finales para todos los sensores del tree.
@@ -195,7 +495,17 @@ def calibrate_tree(
     Args:
         tree: Tree con estructura completa y offsets calculados
         reference_sensor_id: Sensor de referencia absoluta (None = usar root.calibset.reference_id)
-        output_csv: Ruta para exportar CSV (None = no exportar)
+        output_csv: Ruta para exportar CSV (None = no exportar). Con extensión
+            .parquet/.feather (requiere pyarrow) o .xlsx (requiere openpyxl) se
+            escribe en ese formato; sin el paquete, ImportError (ver _write_table)
+        verbose: Si False, no imprime las líneas por set y por sensor (solo el resumen)
+        deduplicate: Si True, un sensor que aparece en varios sets de R1 se queda con
+            una sola fila: Calculado (menor Error_K) > Referencia > Descartado > Sin conexión
+        max_error_ratio: None (por defecto) = resultado exacto con todos los caminos. Con
+            un valor (ej: 10) se ignoran los caminos cuyo error supera ese factor del
+            menor error del sensor: su peso relativo es < 1/ratio² y no cambian el
+            resultado más allá de esa tolerancia. N_Paths cuenta solo los usados.
+            Debe ser >= 1 (ValueError si no)
     
     Returns:
         DataFrame con constantes de calibración
@@ -206,7 +516,9 @@ def calibrate_tree(
         >>> df = calibrate_tree(tree, output_csv="../data/results/calibration_constants.csv")
         >>> print(df[df['Status'] == 'Calculado'])
     """
-    results = []
+    # Con ratio < 1 el corte quedaría por debajo del error del propio mejor camino
+    if max_error_ratio is not None and not max_error_ratio >= 1:
+        raise ValueError(f"max_error_ratio debe ser None o >= 1 (recibido: {max_error_ratio})")
     
     root = tree.get_root()
     if root is None:
@@ -225,102 +537,143 @@ def calibrate_tree(
     r1_entries = tree.get_entries_by_round(1)
     print(f"\nProcesando {len(r1_entries)} sets de Ronda 1...")
     
-    total_sensors = 0
-    calculated_sensors = 0
+    # Rondas 2/3 y sensores de cada set, resueltos una vez para todos los sensores
+    # (se reconstruye en cada llamada: refleja siempre los offsets actuales)
+    path_index = _build_path_index(tree)
     
-    for entry in sorted(r1_entries, key=lambda e: e.set_number):
-        print(f"\n  Set {entry.set_number}:")
+    # Columnas preasignadas con su dtype final (una fila por sensor de R1 + la referencia)
+    r1_entries = sorted(r1_entries, key=lambda e: e.set_number)
+    n_rows = sum(len(entry.calibset.sensors) for entry in r1_entries) + 1
+    columns = _allocate_result_columns(n_rows, sensor_dtype=np.int64 if reference_sensor_id is not None else object)
+    
+    total_sensors = 0
+    k = 0
+    
+    # Sensores calculados: su fila, si es raised y sus caminos. La media ponderada
+    # de todos ellos se calcula en bloque al terminar el recorrido
+    calc_rows = []
+    calc_is_raised = []
+    calc_offsets = []
+    calc_errors = []
+    set_starts = []  # (set_number, primer índice de calc_rows del set), para verbose
+    
+    for entry in r1_entries:
+        # Invariantes del set, fuera del bucle de sensores
+        set_number = entry.set_number
+        round_number = tree.get_round(entry)
+        discarded = set(entry.discarded_sensors)
+        raised = set(entry.raised_sensors)
+        set_starts.append((set_number, len(calc_rows)))
         
         for sensor in entry.calibset.sensors:
             total_sensors += 1
             
             # Verificar si está descartado
-            if entry.is_sensor_discarded(sensor):
-                results.append({
-                    'Sensor': sensor.id,
-                    'Set': entry.set_number,
-                    'Round': tree.get_round(entry),
-                    'Constante_Calibracion_K': np.nan,
-                    'Error_K': np.nan,
-                    'N_Paths': 0,
-                    'Status': 'Descartado'
-                })
+            if sensor in discarded:
+                _write_record(columns, k, sensor.id, set_number, round_number, np.nan, np.nan, 0, 'Descartado')
+                k += 1
                 continue
             
-            # Encontrar caminos desde sensor hasta referencia
-            paths = find_all_paths_to_reference(sensor, entry, tree)
+            # Offsets y errores de todos los caminos desde sensor hasta referencia
+            # (solo los números: el detalle de cada camino lo exporta export_calibration_details)
+            path_offsets, path_errors = _path_totals(sensor, entry, path_index, max_error_ratio)
+            n_paths = path_offsets.size
             
-            if not paths:
-                results.append({
-                    'Sensor': sensor.id,
-                    'Set': entry.set_number,
-                    'Round': tree.get_round(entry),
-                    'Constante_Calibracion_K': np.nan,
-                    'Error_K': np.nan,
-                    'N_Paths': 0,
-                    'Status': 'Sin conexión'
-                })
+            if n_paths == 0:
+                _write_record(columns, k, sensor.id, set_number, round_number, np.nan, np.nan, 0, 'Sin conexión')
+                k += 1
                 continue
             
-            # Media ponderada de todos los caminos
-            offset, error = weighted_average_paths(paths)
-            
-            if offset is not None:
-                calculated_sensors += 1
-                results.append({
-                    'Sensor': sensor.id,
-                    'Set': entry.set_number,
-                    'Round': tree.get_round(entry),
-                    'Constante_Calibracion_K': offset,
-                    'Error_K': error,
-                    'N_Paths': len(paths),
-                    'Status': 'Calculado'
-                })
-                
-                if sensor in entry.raised_sensors:
-                    print(f"    Sensor {sensor.id} (RAISED): {offset:.4f} ± {error:.4f} K ({len(paths)} caminos)")
-                elif len(paths) > 2:
-                    print(f"    Sensor {sensor.id}: {offset:.4f} ± {error:.4f} K ({len(paths)} caminos)")
+            # Offset y error se rellenan abajo con la media ponderada de sus caminos
+            _write_record(columns, k, sensor.id, set_number, round_number, np.nan, np.nan, n_paths, 'Calculado')
+            calc_rows.append(k)
+            calc_is_raised.append(sensor in raised)
+            calc_offsets.append(path_offsets)
+            calc_errors.append(path_errors)
+            k += 1
+    
+    # Media ponderada de todos los sensores calculados a la vez (un solo camino: su offset y error)
+    calculated_sensors = len(calc_rows)
+    if calc_rows:
+        rows = np.asarray(calc_rows, dtype=np.intp)
+        offsets, errors = _weighted_average_groups(
+            np.concatenate(calc_offsets), np.concatenate(calc_errors), columns['N_Paths'][rows]
+        )
+        columns['Constante_Calibracion_K'][rows] = offsets
+        columns['Error_K'][rows] = errors
+    
+    if verbose:
+        set_starts.append((None, len(calc_rows)))
+        for (set_number, start), (_, end) in zip(set_starts, set_starts[1:]):
+            print(f"\n  Set {set_number}:")
+            for row, is_raised in zip(calc_rows[start:end], calc_is_raised[start:end]):
+                sensor_id = columns['Sensor'][row]
+                offset = columns['Constante_Calibracion_K'][row]
+                error = columns['Error_K'][row]
+                n_paths = columns['N_Paths'][row]
+                if is_raised:
+                    print(f"    Sensor {sensor_id} (RAISED): {offset:.4f} ± {error:.4f} K ({n_paths} caminos)")
+                elif n_paths > 2:
+                    print(f"    Sensor {sensor_id}: {offset:.4f} ± {error:.4f} K ({n_paths} caminos)")
     
     # Agregar referencia absoluta
-    results.append({
-        'Sensor': reference_sensor_id,
-        'Set': root.set_number,
-        'Round': tree.get_round(root),  # Calcular dinámicamente (debería ser 3)
-        'Constante_Calibracion_K': 0.0,
-        'Error_K': 0.0,
-        'N_Paths': 0,
-        'Status': 'Referencia'
-    })
-    
-    # Crear DataFrame
-    df = pd.DataFrame(results)
-    df = df.sort_values(['Set', 'Sensor'])
+    # (Round calculado dinámicamente, debería ser 3)
+    _write_record(columns, k, reference_sensor_id, root.set_number, tree.get_round(root), 0.0, 0.0, 0, 'Referencia')
+    k += 1
+    
+    # Crear DataFrame de una vez a partir de las columnas ya tipadas, ordenadas
+    # por (Set, Sensor) con np.lexsort sobre los arrays numéricos (si no hay
+    # sensor de referencia la columna Sensor es object y se ordena con pandas)
+    columns = {name: values[:k] for name, values in columns.items()}
+    if columns['Sensor'].dtype != object:
+        order = np.lexsort((columns['Sensor'], columns['Set']))
+        df = pd.DataFrame({name: values[order] for name, values in columns.items()})
+    else:
+        df = pd.DataFrame(columns).sort_values(['Set', 'Sensor'], ignore_index=True)
+    if deduplicate:
+        # Status como categórica solo para deduplicar: sus códigos son la prioridad.
+        # El índice sigue el orden (Set, Sensor): sort_index lo recupera tras deduplicar
+        df['Status'] = pd.Categorical(df['Status'], categories=list(_STATUS_PRIORITY))
+        df = _drop_duplicate_sensors(df).sort_index()
+        # Se devuelve como strings (object), igual que sin deduplicar
+        df['Status'] = df['Status'].astype(object)
     
     # Resumen
     print("\n" + "=" * 70)
     print(f"[OK] Calibración completada:")
     print(f"  Total sensores: {total_sensors}")
     print(f"  Calculados: {calculated_sensors}")
-    print(f"  Descartados: {len(df[df['Status'] == 'Descartado'])}")
-    print(f"  Sin conexión: {len(df[df['Status'] == 'Sin conexión'])}")
-    
-    # Estadísticas de caminos
-    calculated = df[df['Status'] == 'Calculado']
-    if len(calculated) > 0:
+    # Recuento por estado en una sola pasada (sin filtrar el DataFrame por cada uno)
+    status_counts = df['Status'].value_counts()
+    print(f"  Descartados: {status_counts.get('Descartado', 0)}")
+    print(f"  Sin conexión: {status_counts.get('Sin conexión', 0)}")
+    
+    # Estadísticas de caminos (un solo agg sobre la columna N_Paths filtrada)
+    if status_counts.get('Calculado', 0) > 0:
+        path_stats = df.loc[df['Status'] == 'Calculado', 'N_Paths'].agg(['mean', 'max', 'min'])
         print(f"\n  Caminos por sensor:")
-        print(f"    Promedio: {calculated['N_Paths'].mean():.1f}")
-        print(f"    Máximo: {calculated['N_Paths'].max()}")
-        print(f"    Mínimo: {calculated['N_Paths'].min()}")
+        print(f"    Promedio: {path_stats['mean']:.1f}")
+        print(f"    Máximo: {int(path_stats['max'])}")
+        print(f"    Mínimo: {int(path_stats['min'])}")
     
-    # Exportar CSV
+    # Exportar (CSV, o el formato que indique la extensión)
     if output_csv:
-        df.to_csv(output_csv, index=False)
-        print(f"\n[OK] CSV exportado: {output_csv}")
+        fmt = _write_table(df, output_csv)
+        print(f"\n[OK] {fmt} exportado: {output_csv}")
     
     return df
 
 
+# Columnas de export_calibration_details, en el orden de cada fila
+_DETAIL_COLUMNS = (
+    'Sensor', 'Set', 'Round', 'Path_Number',
+    'Paso1_From', 'Paso1_To', 'Paso1_Set', 'Paso1_Offset_K', 'Paso1_Error_K',
+    'Paso2_From', 'Paso2_To', 'Paso2_Set', 'Paso2_Offset_K', 'Paso2_Error_K',
+    'Paso3_From', 'Paso3_To', 'Paso3_Set', 'Paso3_Offset_K', 'Paso3_Error_K',
+    'Total_Offset_K', 'Total_Error_K',
+)
+
+
 def export_calibration_details(
     tree: Tree,
     output_csv: str,
@@ -338,7 +691,8 @@ def export_calibration_details(
     
     Args:
         tree: Tree con estructura completa
-        output_csv: Ruta para exportar CSV
+        output_csv: Ruta para exportar CSV (.parquet/.feather con pyarrow, .xlsx
+            con openpyxl; sin el paquete, ImportError)
         reference_sensor_id: Sensor de referencia (None = usar root.reference_id)
     
     Returns:
@@ -359,111 +713,76 @@ def export_calibration_details(
     
     # Solo procesar R1
     r1_entries = tree.get_entries_by_round(1)
+    path_index = _build_path_index(tree)
     
     for entry in sorted(r1_entries, key=lambda e: e.set_number):
+        # Invariantes del set, fuera del bucle de sensores
+        set_number = entry.set_number
+        round_number = tree.get_round(entry)
+        discarded = set(entry.discarded_sensors)
+        
         for sensor in entry.calibset.sensors:
             # Skip descartados
-            if entry.is_sensor_discarded(sensor):
+            if sensor in discarded:
                 continue
             
-            # Buscar todos los caminos
-            paths = find_all_paths_to_reference(sensor, entry, tree)
-            
-            if not paths:
-                continue
-            
-            # Registrar cada camino individualmente
-            for path_idx, (total_offset, total_error, path_details) in enumerate(paths, 1):
-                # Extraer detalles de cada paso
-                entry_r1, raised_r1 = path_details[0]
-                entry_r2, raised_r2 = path_details[1]
-                entry_r3, reference = path_details[2]
-                
-                # Paso 1: sensor → raised_r1
-                offset_1, error_1 = entry_r1.get_offset_to_raised(sensor, raised_r1)
-                
-                # Paso 2: raised_r1 → raised_r2
-                offset_2, error_2 = entry_r2.get_offset_to_raised(raised_r1, raised_r2)
-                
-                # Paso 3: raised_r2 → reference
-                if raised_r2.id == reference:
-                    offset_3 = 0.0
-                    error_3 = 0.0
-                else:
-                    offset_3 = entry_r3.calibset.mean_offsets.get(raised_r2.id, 0.0)
-                    error_3 = entry_r3.calibset.std_offsets.get(raised_r2.id, 0.0)
+            # Recorrer todos los caminos (mismo orden que find_all_paths_to_reference).
+            # Los pasos 2 y 3 de cada raised_r1 ya están calculados en el índice:
+            # solo el paso 1 depende del sensor
+            path_idx = 0
+            path_offsets = []
+            path_errors = []
+            # (offset_1, error_1: paso 1, sensor → raised_r1)
+            for raised_r1, offset_1, error_1, offsets_23, errors_23_sq, tails, steps in _sensor_routes(sensor, entry, path_index):
+                total_offsets = offset_1 + offsets_23
+                total_errors = np.sqrt(error_1 * error_1 + errors_23_sq)
+                path_offsets.append(total_offsets)
+                path_errors.append(total_errors)
                 
-                results.append({
-                    'Sensor': sensor.id,
-                    'Set': entry.set_number,
-                    'Round': tree.get_round(entry),  # Calcular dinámicamente
-                    'Path_Number': path_idx,
+                # Registrar cada camino individualmente
+                for total_offset, total_error, tail, step in zip(total_offsets.tolist(), total_errors.tolist(), tails, steps):
+                    path_idx += 1
+                    (entry_r2, raised_r2), (entry_r3, reference) = tail
+                    # Paso 2: raised_r1 → raised_r2; paso 3: raised_r2 → reference
+                    offset_2, error_2, offset_3, error_3 = step
                     
-                    # Paso 1: sensor → raised_r1 en R1
-                    'Paso1_From': sensor.id,
-                    'Paso1_To': raised_r1.id,
-                    'Paso1_Set': entry_r1.set_number,
-                    'Paso1_Offset_K': offset_1,
-                    'Paso1_Error_K': error_1,
-                    
-                    # Paso 2: raised_r1 → raised_r2 en R2
-                    'Paso2_From': raised_r1.id,
-                    'Paso2_To': raised_r2.id,
-                    'Paso2_Set': entry_r2.set_number,
-                    'Paso2_Offset_K': offset_2,
-                    'Paso2_Error_K': error_2,
-                    
-                    # Paso 3: raised_r2 → reference en R3
-                    'Paso3_From': raised_r2.id,
-                    'Paso3_To': reference,
-                    'Paso3_Set': entry_r3.set_number,
-                    'Paso3_Offset_K': offset_3,
-                    'Paso3_Error_K': error_3,
-                    
-                    # Total
-                    'Total_Offset_K': total_offset,
-                    'Total_Error_K': total_error,
-                })
+                    results.append((
+                        sensor.id, set_number, round_number, path_idx,
+                        # Paso 1: sensor → raised_r1 en R1
+                        sensor.id, raised_r1.id, set_number, offset_1, error_1,
+                        # Paso 2: raised_r1 → raised_r2 en R2
+                        raised_r1.id, raised_r2.id, entry_r2.set_number, offset_2, error_2,
+                        # Paso 3: raised_r2 → reference en R3
+                        raised_r2.id, reference, entry_r3.set_number, offset_3, error_3,
+                        # Total
+                        total_offset, total_error,
+                    ))
+            
+            if path_idx == 0:
+                continue
             
             # Añadir también la media ponderada
-            if len(paths) > 0:
-                final_offset, final_error = weighted_average_paths(paths)
-                
-                results.append({
-                    'Sensor': sensor.id,
-                    'Set': entry.set_number,
-                    'Round': tree.get_round(entry),  # Calcular dinámicamente
-                    'Path_Number': 0,  # 0 indica media ponderada
-                    
-                    'Paso1_From': sensor.id,
-                    'Paso1_To': 'PROMEDIO',
-                    'Paso1_Set': entry.set_number,
-                    'Paso1_Offset_K': np.nan,
-                    'Paso1_Error_K': np.nan,
-                    
-                    'Paso2_From': 'PROMEDIO',
-                    'Paso2_To': 'PROMEDIO',
-                    'Paso2_Set': np.nan,
-                    'Paso2_Offset_K': np.nan,
-                    'Paso2_Error_K': np.nan,
-                    
-                    'Paso3_From': 'PROMEDIO',
-                    'Paso3_To': reference,
-                    'Paso3_Set': entry_r3.set_number,
-                    'Paso3_Offset_K': np.nan,
-                    'Paso3_Error_K': np.nan,
-                    
-                    'Total_Offset_K': final_offset,
-                    'Total_Error_K': final_error,
-                })
-    
-    # Crear DataFrame
-    df = pd.DataFrame(results)
+            if path_idx == 1:
+                final_offset, final_error = float(path_offsets[0][0]), float(path_errors[0][0])
+            else:
+                final_offset, final_error = _weighted_average(np.concatenate(path_offsets), np.concatenate(path_errors))
+            
+            # (Path_Number 0 indica media ponderada)
+            results.append((
+                sensor.id, set_number, round_number, 0,
+                sensor.id, 'PROMEDIO', set_number, np.nan, np.nan,
+                'PROMEDIO', 'PROMEDIO', np.nan, np.nan, np.nan,
+                'PROMEDIO', reference, entry_r3.set_number, np.nan, np.nan,
+                final_offset, final_error,
+            ))
+    
+    # Crear DataFrame (filas como tuplas en el orden de _DETAIL_COLUMNS: sin un dict por fila)
+    df = pd.DataFrame.from_records(results, columns=list(_DETAIL_COLUMNS))
     df = df.sort_values(['Sensor', 'Path_Number'])
     
     # Exportar
-    df.to_csv(output_csv, index=False)
-    print(f"[OK] Detalles exportados: {output_csv}")
+    fmt = _write_table(df, output_csv)
+    print(f"[OK] Detalles exportados ({fmt}): {output_csv}")
     print(f"  Total filas: {len(df)}")
     print(f"  Sensores únicos: {df['Sensor'].nunique()}")
     
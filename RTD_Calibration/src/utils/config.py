@@ -3,11 +3,30 @@ Utilidades para configuración y validación.
 
 Funciones:
 - load_config(): Carga config.yml
+- is_verbose(): Indica si se imprimen mensajes detallados por run/canal
+- get_sets_config(): Configuración de todos los sets con claves float
+- get_set_config(): Configuración de un set concreto
 - validate_sensor_in_set(): Valida sensor en set
 """
+import copy
 import yaml
+from functools import lru_cache
 from pathlib import Path
-from typing import Union
+from typing import Dict, Optional, Union
+
+# Parser en C (libyaml) si PyYAML se compiló con él; si no, el SafeLoader en Python
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@lru_cache(maxsize=8)
+def _read_yaml(path: str, mtime: float) -> dict:
+    """
+    Lee y parsea un YAML. Memoizado por (ruta, mtime): si el archivo cambia en
+    disco, su mtime cambia y se vuelve a leer automáticamente.
+    """
+    with open(path, 'r') as f:
+        # Equivalente a yaml.safe_load, con el loader en C cuando está disponible
+        return yaml.load(f, Loader=_YAML_LOADER)
 
 
 def load_config(config_path: Union[str, Path, None] = None) -> dict:
@@ -23,20 +42,111 @@ def load_config(config_path: Union[str, Path, None] = None) -> dict:
     Examples:
         >>> config = load_config()
         >>> sets = config['sensors']['sets']
+    
+    Notes:
+        - El YAML parseado se memoiza por (ruta absoluta, mtime): varias llamadas
+          con el mismo archivo sin modificar no vuelven a leer ni parsear el disco,
+          aunque lleguen por rutas distintas (relativa, absoluta o por defecto)
+        - Cada llamada devuelve una copia independiente: modificar el dict
+          devuelto no altera la versión cacheada
     """
     if config_path is None:
         # Asumir que estamos en src/ o notebooks/
         config_path = Path(__file__).parent.parent.parent / "config" / "config.yml"
     
-    config_path = Path(config_path)
+    # Ruta absoluta normalizada: la misma config pedida por ruta relativa,
+    # absoluta o por defecto comparte una única entrada de la caché
+    config_path = Path(config_path).resolve()
+    
+    # Un solo stat: comprueba existencia y obtiene el mtime para la caché
+    try:
+        mtime = config_path.stat().st_mtime
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file not found: {config_path}") from None
+    
+    return copy.deepcopy(_read_yaml(str(config_path), mtime))
+
+
+def is_verbose(config: Optional[dict]) -> bool:
+    """
+    Indica si deben imprimirse los mensajes detallados (por run y por canal).
+    
+    Args:
+        config: Diccionario de configuración (o None)
+    
+    Returns:
+        bool: Valor de logging.verbose en config (True por defecto)
+    
+    Examples:
+        >>> if is_verbose(config):
+        ...     print(f"  [OK] Cargado {filename}")
+    
+    Notes:
+        - Los avisos de error ([FAIL], ficheros no encontrados) se imprimen siempre
+        - Con verbose: false no se formatean los mensajes informativos de los
+          bucles por run/canal, que dominan la salida en ejecuciones grandes
+    """
+    if not config:
+        return True
+    return bool((config.get('logging') or {}).get('verbose', True))
+
+
+def get_sets_config(config: dict) -> Dict[float, dict]:
+    """
+    Devuelve config.sensors.sets con las claves normalizadas a float.
+    
+    Args:
+        config: Diccionario de configuración
+    
+    Returns:
+        Dict[float, dict]: {set_number: config_del_set} ('3', '3.0' y 3 → 3.0)
+    
+    Examples:
+        >>> sets_config = get_sets_config(config)  # una vez
+        >>> sets_config[3.0]['parent_set']          # búsquedas directas, sin float()
+    
+    Notes:
+        - Pensada para construirse una vez y reutilizarse en bucles por set
+        - Claves no numéricas se conservan tal cual
+    """
+    sets_config = {}
+    for key, set_config in ((config or {}).get('sensors') or {}).get('sets', {}).items():
+        try:
+            key = float(key)
+        except (TypeError, ValueError):
+            pass
+        sets_config.setdefault(key, set_config or {})
+    return sets_config
+
+
+def get_set_config(config: dict, set_number: Union[int, float, str]) -> Optional[dict]:
+    """
+    Devuelve la configuración de un set o None si no existe.
+    
+    Prueba primero la clave float (formato del config.yml, ej: 3.0) y solo si
+    no está, los formatos en texto ('3.0', '3') y entero (este último solo
+    si el número es entero: 3.5 no cae en el set 3).
+    """
+    sets_dict = ((config or {}).get('sensors') or {}).get('sets', {})
     
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config file not found: {config_path}")
+    try:
+        set_float = float(set_number)
+    except (TypeError, ValueError):
+        return sets_dict.get(set_number)
     
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+    # Caso habitual (clave float del YAML): una sola búsqueda
+    try:
+        return sets_dict[set_float]
+    except KeyError:
+        pass
     
-    return config
+    keys = [f'{set_number}.0', str(set_number)]
+    if set_float.is_integer():
+        keys.append(int(set_float))
+    for key in keys:
+        if key in sets_dict:
+            return sets_dict[key]
+    return None
 
 
 def validate_sensor_in_set(sensor_id: int, set_id: Union[int, float], 
@@ -58,15 +168,8 @@ def validate_sensor_in_set(sensor_id: int, set_id: Union[int, float],
         >>> print(is_valid)  # True
     """
     try:
-        # Intentar con diferentes formatos de key
-        sets_dict = config.get('sensors', {}).get('sets', {})
-        
-        # Buscar el set (puede estar como '3.0', '3', o 3.0)
-        set_config = None
-        for key in [f'{set_id}.0', str(set_id), float(set_id), int(set_id)]:
-            if key in sets_dict:
-                set_config = sets_dict[key]
-                break
+        # Buscar el set (puede estar como 3.0, '3.0' o '3')
+        set_config = get_set_config(config, set_id)
         
         if set_config is None:
             return False
@@ -3,9 +3,27 @@ Utilidades para filtrado y validación de runs.
 
 Funciones:
 - should_exclude_run(): Detecta keywords de exclusión
+- normalize_set_numbers(): Convierte CalibSetNumber a numérico una sola vez
 - filter_valid_runs(): Filtra runs válidos de un set
 - get_discarded_sensors(): Obtiene sensores descartados de un set
 """
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+from .config import get_set_config
+
+# Keywords de exclusión por defecto ('pre', 'st', 'lar')
+DEFAULT_EXCLUDE_KEYWORDS = ('pre', 'st', 'lar')
+
+
+@lru_cache(maxsize=16)
+def _exclude_regex(keywords: tuple):
+    """Regex compilada que detecta cualquiera de las keywords, o None si no hay."""
+    if not keywords:
+        return None
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
 
 
 def should_exclude_run(filename: str, exclude_keywords: list = None) -> bool:
@@ -34,10 +52,43 @@ def should_exclude_run(filename: str, exclude_keywords: list = None) -> bool:
         - 'lar': archivos de prueba o descartados
     """
     if exclude_keywords is None:
-        exclude_keywords = ['pre', 'st', 'lar']
+        exclude_keywords = DEFAULT_EXCLUDE_KEYWORDS
+    
+    # Una sola pasada con la regex compilada en lugar de una búsqueda por keyword
+    # (filename en minúsculas, keywords tal cual)
+    exclude_re = _exclude_regex(tuple(exclude_keywords))
+    return exclude_re is not None and exclude_re.search(filename.lower()) is not None
+
+
+def normalize_set_numbers(logfile):
+    """
+    Devuelve el logfile con la columna CalibSetNumber convertida a numérico.
+    
+    Args:
+        logfile: DataFrame con LogFile.csv
+    
+    Returns:
+        DataFrame: El mismo logfile si la columna ya es numérica; si no, una
+        copia superficial con CalibSetNumber como float (NaN si no convertible)
+    
+    Examples:
+        >>> logfile = normalize_set_numbers(logfile)  # una vez, antes de iterar sets
+        >>> valid_runs = filter_valid_runs(logfile, set_number=3)
     
-    filename_lower = filename.lower()
-    return any(keyword in filename_lower for keyword in exclude_keywords)
+    Notes:
+        - Reemplaza comas por puntos (formato europeo)
+        - Etiquetas como 'FRAME_SET1' quedan como NaN y no pertenecen a ningún set
+        - Llamarla antes de iterar sets evita repetir la conversión por cada set
+    """
+    set_column = logfile['CalibSetNumber']
+    if pd.api.types.is_numeric_dtype(set_column):
+        return logfile
+    
+    set_numbers = pd.to_numeric(
+        set_column.astype(str).str.strip().str.replace(',', '.', regex=False),
+        errors='coerce'
+    )
+    return logfile.assign(CalibSetNumber=set_numbers)
 
 
 def filter_valid_runs(logfile, set_number: int, exclude_keywords: list = None) -> list:
@@ -66,31 +117,27 @@ def filter_valid_runs(logfile, set_number: int, exclude_keywords: list = None) -
         - Selection='BAD' indica runs con problemas
         - Devuelve lista vacía si no hay runs válidos
     """
-    # Función auxiliar para convertir set numbers
-    def get_set_number(x):
-        try:
-            # Reemplazar comas por puntos (formato europeo)
-            return float(str(x).replace(',', '.'))
-        except (ValueError, TypeError):
-            return None
-    
-    # Crear columna temporal con set number
-    logfile_temp = logfile.copy()
-    logfile_temp['SetNum'] = logfile_temp['CalibSetNumber'].apply(get_set_number)
+    # CalibSetNumber numérico (no-op si el logfile ya viene normalizado)
+    set_numbers = normalize_set_numbers(logfile)['CalibSetNumber']
     
     # Filtrar por set
-    set_df = logfile_temp[logfile_temp['SetNum'] == float(set_number)]
+    set_df = logfile[set_numbers == float(set_number)]
     
     # Filtrar por Selection != 'BAD'
     valid_df = set_df[set_df['Selection'] != 'BAD']
     
-    # Filtrar por keywords
-    valid_filenames = []
-    for filename in valid_df['Filename'].values:
-        if not should_exclude_run(filename, exclude_keywords):
-            valid_filenames.append(filename)
+    # Filtrar por keywords con una sola búsqueda vectorizada sobre la columna
+    # (mismo criterio que should_exclude_run: substring en el filename en minúsculas)
+    if exclude_keywords is None:
+        exclude_keywords = DEFAULT_EXCLUDE_KEYWORDS
     
-    return valid_filenames
+    filenames = valid_df['Filename']
+    exclude_re = _exclude_regex(tuple(exclude_keywords))
+    if exclude_re is not None:
+        excluded = filenames.str.lower().str.contains(exclude_re, regex=True, na=True)
+        filenames = filenames[~excluded]
+    
+    return filenames.tolist()
 
 
 def get_discarded_sensors(set_number: int, config: dict) -> list:
@@ -114,14 +161,8 @@ def get_discarded_sensors(set_number: int, config: dict) -> list:
         - Estos sensores se excluyen automáticamente en calculate_run_offsets
     """
     try:
-        sets_dict = config.get('sensors', {}).get('sets', {})
-        
-        # Buscar el set (puede estar como '3.0', '3', o 3.0)
-        set_config = None
-        for key in [f'{set_number}.0', str(set_number), float(set_number)]:
-            if key in sets_dict:
-                set_config = sets_dict[key]
-                break
+        # Buscar el set (puede estar como 3.0, '3.0' o '3')
+        set_config = get_set_config(config, set_number)
         
         if set_config is None:
             return []
@@ -34,7 +34,8 @@ def propagate_error(*errors: float) -> float:
     if not errors:
         return 0.0
     
-    return math.sqrt(sum(e**2 for e in errors if e is not None))
+    # math.hypot de varios argumentos es la suma cuadrática en C (sin sobreflujo)
+    return math.hypot(*(e for e in errors if e is not None))
 
 
 def ensure_numeric(value, default=0.0):
@@ -8,17 +8,80 @@ Funciones:
 - process_run_complete(): Procesa run completo con validaciones
 """
 
-import glob
+import math
 import pandas as pd
 import numpy as np
+from functools import lru_cache
 from pathlib import Path
-from typing import Union, Optional, List, Dict, TYPE_CHECKING
+from typing import Union, Optional, List, Dict, Tuple, TYPE_CHECKING
+
+from .config import is_verbose
+
+# Directorio con los .txt de temperaturas (data/temperature_files del repo)
+_TEMPERATURE_FILES_DIR = Path(__file__).parents[2] / "data" / "temperature_files"
+
+# Nombres de columna de los 14 canales (channel_1..channel_14), construidos una vez:
+# el canal N está en _CHANNEL_COLUMNS[N - 1]
+_CHANNEL_COLUMNS = tuple(f"channel_{i}" for i in range(1, 15))
+
+# Columnas de sensores en el logfile (S1..S20, en orden de canal)
+_SENSOR_COLUMNS = tuple(f"S{i}" for i in range(1, 21))
 
 if TYPE_CHECKING:
     from ..run import Run
     from ..sensor import Sensor
 
 
+@lru_cache(maxsize=None)
+def _temperature_file_index() -> Tuple[Dict[str, str], Dict[Path, int]]:
+    """
+    Índice {nombre sin .txt: ruta} de todos los .txt bajo data/temperature_files.
+    
+    Se recorre el árbol de directorios una sola vez; si hay nombres repetidos
+    gana la primera ruta en orden alfabético. Devuelve también {directorio:
+    mtime} de cada directorio recorrido, para detectar después si algo cambió.
+    """
+    index = {}
+    dir_mtimes = {}
+    if _TEMPERATURE_FILES_DIR.is_dir():
+        dir_mtimes[_TEMPERATURE_FILES_DIR] = _TEMPERATURE_FILES_DIR.stat().st_mtime_ns
+    for path in sorted(_TEMPERATURE_FILES_DIR.rglob("*")):
+        if path.is_dir():
+            dir_mtimes[path] = path.stat().st_mtime_ns
+        elif path.suffix == ".txt":
+            index.setdefault(path.stem, str(path))
+    return index, dir_mtimes
+
+
+def _directories_changed(dir_mtimes: Dict[Path, int]) -> bool:
+    """True si algún directorio indexado cambió (ficheros o subdirectorios añadidos, movidos o borrados)."""
+    if not dir_mtimes:
+        return _TEMPERATURE_FILES_DIR.is_dir()
+    for directory, mtime in dir_mtimes.items():
+        try:
+            if directory.stat().st_mtime_ns != mtime:
+                return True
+        except OSError:
+            return True
+    return False
+
+
+def _find_temperature_file(filename: str) -> Optional[str]:
+    """Ruta del archivo {filename}.txt, o None si no existe."""
+    index, dir_mtimes = _temperature_file_index()
+    filepath = index.get(filename)
+    if filepath is None or not Path(filepath).exists():
+        # Solo se reconstruye si el árbol cambió desde que se indexó (un stat por
+        # directorio): muchos runs ausentes no repiten el rglob completo
+        if _directories_changed(dir_mtimes):
+            _temperature_file_index.cache_clear()
+            index, _ = _temperature_file_index()
+            filepath = index.get(filename)
+        if filepath is not None and not Path(filepath).exists():
+            filepath = None
+    return filepath
+
+
 def load_run_from_file(filename: str, config: dict) -> 'Run':
     """
     Carga datos de un archivo .txt y crea un objeto Run con datos crudos.
@@ -31,7 +94,7 @@ def load_run_from_file(filename: str, config: dict) -> 'Run':
         Run: Objeto Run con timestamps y temperatures cargados
     
     Esta función:
-    1. Busca el archivo .txt recursivamente
+    1. Busca el archivo .txt (índice recursivo cacheado de data/temperature_files)
     2. Lee y parsea las columnas Date/Time
     3. Extrae canales de temperatura (channel_1 a channel_14)
     4. Filtra temperaturas fuera de rango válido
@@ -44,17 +107,12 @@ def load_run_from_file(filename: str, config: dict) -> 'Run':
     
     run = Run(filename)
     
-    # Buscar archivo
-    repo_root = Path(__file__).parents[2]  # src/utils/ -> src/
-    search_path = repo_root / "data" / "temperature_files"
-    
-    matches = glob.glob(str(search_path / "**" / f"{filename}.txt"), recursive=True)
-    if not matches:
+    # Buscar archivo (índice nombre → ruta construido una vez, no un glob recursivo por run)
+    filepath = _find_temperature_file(filename)
+    if filepath is None:
         print(f"  No se encontró {filename}.txt")
         return run
     
-    filepath = matches[0]
-    
     # Leer archivo
     try:
         # Leer sin header, el archivo no tiene nombres de columnas
@@ -62,19 +120,13 @@ def load_run_from_file(filename: str, config: dict) -> 'Run':
         
         # Asignar nombres de columnas manualmente
         # Formato: Date, Time, channel_1, channel_2, ..., channel_14
-        col_names = ['Date', 'Time'] + [f'channel_{i}' for i in range(1, 15)]
+        col_names = ['Date', 'Time'] + list(_CHANNEL_COLUMNS)
         df.columns = col_names
         
-    except Exception as e:
+    except (OSError, pd.errors.EmptyDataError, pd.errors.ParserError, ValueError) as e:
         print(f"  Error leyendo {filepath}: {e}")
         return run
     
-    # Verificar columnas requeridas
-    required_cols = ['Date', 'Time']
-    if not all(col in df.columns for col in required_cols):
-        print(f"  Columnas requeridas faltan en {filename}")
-        return run
-    
     # Crear timestamps
     try:
         datetime_str = df['Date'] + ' ' + df['Time']
@@ -87,31 +139,31 @@ def load_run_from_file(filename: str, config: dict) -> 'Run':
             print(f"  Error: No se pudieron parsear timestamps en {filename}")
             return run
         
-        # Filtrar DataFrame y timestamps
-        df = df[valid_mask].copy().reset_index(drop=True)
+        # Filtrar DataFrame y timestamps (la indexación booleana ya devuelve una copia)
+        df = df[valid_mask].reset_index(drop=True)
         timestamps = timestamps[valid_mask].reset_index(drop=True)
         
         run.timestamps = timestamps
-    except Exception as e:
+    except (TypeError, ValueError) as e:
         print(f"  Error parseando timestamps en {filename}: {e}")
         return run
     
-    # Extraer temperaturas (channel_1 a channel_14)
-    temp_cols = {}
-    for i in range(1, 15):  # 14 canales
-        col_name = f'channel_{i}'
-        if col_name in df.columns:
-            temps = pd.to_numeric(df[col_name], errors='coerce')
-            
-            # Filtrar valores fuera de rango válido (LN2: ~77K, ambiente: ~300K)
-            valid_mask = (temps >= 50) & (temps <= 400)  # K
-            temps_filtered = temps.where(valid_mask, np.nan)
-            
-            temp_cols[col_name] = temps_filtered.values  # Usar .values para array puro
+    # Extraer temperaturas (channel_1 a channel_14) como un único bloque 2D
+    temp_cols = [col for col in _CHANNEL_COLUMNS if col in df.columns]
     
     if temp_cols:
-        run.temperatures = pd.DataFrame(temp_cols, index=timestamps)
-        print(f"  [OK] Cargado {filename}: {len(run.temperatures)} registros, {len(temp_cols)} canales")
+        # float32: precisión de ~1e-5 K a 77-300 K, sobrada para el sensor, y la
+        # mitad de memoria y ancho de banda en los recorridos de la ventana
+        # (copy=True: con copy-on-write el array devuelto puede ser de solo lectura)
+        temps = df[temp_cols].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float32, copy=True)
+        
+        # Filtrar valores fuera de rango válido (LN2: ~77K, ambiente: ~300K)
+        temps[(temps < 50) | (temps > 400)] = np.nan  # K
+        
+        # Envolver el array sin copiarlo: una sola asignación para todos los canales
+        run.temperatures = pd.DataFrame(temps, index=timestamps, columns=temp_cols, copy=False)
+        if is_verbose(config):
+            print(f"  [OK] Cargado {filename}: {len(run.temperatures)} registros, {len(temp_cols)} canales")
     else:
         print(f"  [WARNING] No se encontraron canales de temperatura en {filename}")
     
@@ -153,9 +205,11 @@ def map_sensor_ids_to_run(run: 'Run', logfile, config: dict) -> list:
                 run.is_valid = selection_str != "BAD"
                 break
     
-    # Obtener sensor_ids
-    sensor_cols = [f"S{i}" for i in range(1, 21)]
-    sensor_ids = [int(float(row[col])) for col in sensor_cols if col in row.index and pd.notna(row[col])]
+    # Obtener sensor_ids: columnas S1..S20 presentes resueltas una vez sobre el
+    # logfile, sin comprobar pertenencia al índice de la fila por cada columna
+    sensor_cols = [col for col in _SENSOR_COLUMNS if col in match.columns]
+    # (huecos descartados con un solo dropna sobre la fila, no pd.notna por celda)
+    sensor_ids = [int(float(value)) for value in row[sensor_cols].dropna().tolist()]
     
     return sensor_ids
 
@@ -170,6 +224,7 @@ def calculate_run_offsets(run: 'Run', reference_channel: int,
     Modifica run in-place:
         - run.offsets: {canal: offset_medio} canales válidos (1-12)
         - run.offset_errors: {canal: std_error} error de cada offset
+          (mismas claves que run.offsets; offsets y errores siempre finitos)
         - run.omitted_channels: {canal: razón} canales omitidos
         - run.reference_channel: canal usado como referencia
     
@@ -224,25 +279,39 @@ def calculate_run_offsets(run: 'Run', reference_channel: int,
     else:
         start_min, end_min = time_window
     
-    t0 = run.timestamps.min() + pd.Timedelta(minutes=start_min)
-    t1 = run.timestamps.min() + pd.Timedelta(minutes=end_min)
+    start_time = run.timestamps.min()
+    t0 = start_time + pd.Timedelta(minutes=start_min)
+    t1 = start_time + pd.Timedelta(minutes=end_min)
+    
+    # Índice temporal ordenado: copia local si hace falta, el run no se modifica
+    temperatures = run.temperatures
+    if not temperatures.index.is_monotonic_increasing:
+        temperatures = temperatures.sort_index()
     
-    # Usar máscara booleana en lugar de .loc[t0:t1] para evitar KeyError
-    # cuando t0/t1 no existen exactamente en el índice
-    mask = (run.temperatures.index >= t0) & (run.temperatures.index <= t1)
-    window = run.temperatures[mask]
+    # Ventana [t0, t1] por búsqueda binaria: evita KeyError cuando t0/t1 no
+    # existen exactamente en el índice y el slice contiguo no crea máscara
+    time_index = temperatures.index
+    i0 = time_index.searchsorted(t0, side='left')
+    i1 = time_index.searchsorted(t1, side='right')
+    window = temperatures.iloc[i0:i1]
     
     if window.empty:
         print(f"[WARNING] Ventana [{start_min}-{end_min}min] vacía en {run.filename}")
         return
     
-    # Calcular offsets respecto al canal de referencia
-    ref_col = f"channel_{reference_channel}"
-    if ref_col not in window.columns:
-        print(f"[WARNING] Columna {ref_col} no encontrada en {run.filename}")
-        return
+    # Bloque (tiempo × canal) de la ventana y posición entera de cada columna:
+    # a partir de aquí se indexa el array por posición, sin alinear etiquetas.
+    # (ref_col ya se verificó en run.temperatures; la ventana tiene las mismas columnas)
+    # Con el dtype almacenado (float32 si viene de load_run_from_file, float64 si
+    # el DataFrame se construyó fuera): no se pierde precisión al leer la ventana
+    values = window.to_numpy()
+    if values.dtype.kind != 'f':
+        values = values.astype(np.float64)
+    column_position = {col: i for i, col in enumerate(window.columns)}
+    ref_pos = column_position[ref_col]
     
-    ref_temps = window[ref_col]
+    # Mensajes detallados por canal solo si logging.verbose está activo
+    verbose = is_verbose(config)
     
     # Obtener threshold de NaN desde config
     max_nan_threshold = 40  # Default: 40 registros con NaN
@@ -259,26 +328,36 @@ def calculate_run_offsets(run: 'Run', reference_channel: int,
     # Usar el más permisivo de los dos
     effective_threshold = max(max_nan_threshold, dynamic_threshold)
     
+    # Número de NaN por canal en la ventana: se calcula una sola vez y se
+    # reutiliza para la referencia, la búsqueda de alternativa y cada canal
+    nan_counts = np.count_nonzero(np.isnan(values), axis=0)
+    
     # Verificar que la referencia tenga pocos NaN
-    ref_nan_count = ref_temps.isna().sum()
+    ref_nan_count = nan_counts[ref_pos]
     if ref_nan_count > effective_threshold:
         print(f"[WARNING] Referencia original canal {reference_channel} tiene {ref_nan_count} NaN (>{effective_threshold})")
         
-        # Buscar referencia alternativa entre los primeros 12 canales
-        alternative_channel = None
-        for channel_num in range(1, 13):  # Canales 1-12
-            if channel_num == reference_channel:
-                continue
-            
-            channel_col = f"channel_{channel_num}"
-            if channel_col in window.columns:
-                channel_nan_count = window[channel_col].isna().sum()
-                if channel_nan_count <= effective_threshold:
-                    alternative_channel = channel_num
-                    ref_col = channel_col
-                    ref_temps = window[ref_col]
-                    print(f"  [OK] Referencia alternativa: canal {alternative_channel} ({channel_nan_count} NaN)")
-                    break
+        # Buscar referencia alternativa entre los primeros 12 canales:
+        # primer canal (distinto de la referencia) con NaN <= threshold.
+        # Canales ausentes quedan como NaN en counts y nunca cumplen la condición.
+        counts = np.array(
+            [nan_counts[column_position[col]] if col in column_position else np.nan
+             for col in _CHANNEL_COLUMNS[:12]],
+            dtype=np.float64
+        )
+        usable = counts <= effective_threshold
+        if 1 <= reference_channel <= 12:
+            usable[reference_channel - 1] = False
+        
+        # Primer True con argmax (se detiene en el primero), sin materializar
+        # la lista de todos los candidatos para quedarse con el [0]
+        first = int(np.argmax(usable))
+        alternative_channel = first + 1 if usable[first] else None
+        if alternative_channel is not None:
+            ref_col = _CHANNEL_COLUMNS[alternative_channel - 1]
+            ref_pos = column_position[ref_col]
+            if verbose:
+                print(f"  [OK] Referencia alternativa: canal {alternative_channel} ({nan_counts[ref_pos]} NaN)")
         
         if alternative_channel is None:
             print(f"  [FAIL] No se encontró referencia alternativa válida, no se calculan offsets")
@@ -288,34 +367,61 @@ def calculate_run_offsets(run: 'Run', reference_channel: int,
             run.reference_channel = reference_channel  # Actualizar en el objeto Run
     
     # Solo calcular offsets para los primeros 12 canales (ignorar refs en canales 13-14)
-    for channel_num in range(1, 13):  # Canales 1-12
-        channel_col = f"channel_{channel_num}"
-        if channel_col in window.columns:
-            channel_temps = window[channel_col]
-            
-            # Verificar número de NaN en el canal (usa mismo threshold que referencia)
-            nan_count = channel_temps.isna().sum()
-            
-            if nan_count > effective_threshold:
-                run.omitted_channels[channel_num] = f"defectuoso ({nan_count} NaN > {effective_threshold})"
+    # {canal: posición de su columna en values}
+    channel_positions = {
+        n: column_position[_CHANNEL_COLUMNS[n - 1]]
+        for n in range(1, 13) if _CHANNEL_COLUMNS[n - 1] in column_position
+    }
+    channel_nums = list(channel_positions)
+    
+    # Canales con pocos NaN (usa mismo threshold que referencia)
+    good_channels = [n for n in channel_nums if nan_counts[channel_positions[n]] <= effective_threshold]
+    
+    # Diferencias (tiempo × canal) respecto a la referencia en una sola operación,
+    # y media/std (ddof=1) de todos los canales a la vez a partir de Σx y Σx².
+    # La resta y las acumulaciones se hacen en float64 sea cual sea el dtype almacenado
+    good_positions = np.fromiter((channel_positions[n] for n in good_channels), dtype=np.intp, count=len(good_channels))
+    temps = values[:, good_positions]
+    differences = np.subtract(temps, values[:, ref_pos, None], dtype=np.float64)
+    valid = ~np.isnan(differences)
+    
+    # Sumas desplazadas: se resta a cada canal su primer valor válido antes de
+    # acumular Σx y Σx². Sigue siendo una sola pasada, pero evita la cancelación
+    # de Σx² - (Σx)²/n cuando el offset es grande frente a su dispersión.
+    first_valid = np.argmax(valid, axis=0)
+    shift = differences[first_valid, np.arange(differences.shape[1])]
+    shift = np.where(np.isnan(shift), 0.0, shift)
+    differences = np.where(valid, differences - shift, 0.0)
+    
+    n_diff = valid.sum(axis=0)
+    sum_x = differences.sum(axis=0)
+    sum_xx = (differences * differences).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offsets = shift + sum_x / n_diff
+        variances = np.maximum(sum_xx - sum_x * sum_x / n_diff, 0.0) / (n_diff - 1)
+    position = {channel_num: i for i, channel_num in enumerate(good_channels)}
+    
+    for channel_num in channel_nums:
+        if channel_num not in position:
+            nan_count = nan_counts[channel_positions[channel_num]]
+            run.omitted_channels[channel_num] = f"defectuoso ({nan_count} NaN > {effective_threshold})"
+            if verbose:
                 print(f"   [WARNING] Canal {channel_num}: {nan_count} NaN (>{effective_threshold}), omitido como defectuoso")
-                continue
-            
-            # Calcular offset y su error (std del offset en la ventana)
-            differences = (channel_temps - ref_temps).dropna()
+            continue
+        
+        i = position[channel_num]
+        if n_diff[i] > 0:
+            offset = float(offsets[i])
+            offset_error = math.sqrt(variances[i]) if n_diff[i] > 1 else 0.0
             
-            if len(differences) > 0:
-                offset = differences.mean()
-                offset_error = differences.std(ddof=1) if len(differences) > 1 else 0.0
-                
-                # Verificar que el offset no sea NaN
-                if pd.notna(offset):
-                    run.offsets[channel_num] = offset
-                    run.offset_errors[channel_num] = offset_error
-                else:
-                    print(f"   [WARNING] Canal {channel_num}: offset = NaN, omitido")
-            else:
-                print(f"   [WARNING] Canal {channel_num}: sin datos válidos, omitido")
+            # Verificar que el offset no sea NaN (float escalar: math.isnan, sin pasar por pandas)
+            if not math.isnan(offset):
+                run.offsets[channel_num] = offset
+                run.offset_errors[channel_num] = offset_error
+            elif verbose:
+                print(f"   [WARNING] Canal {channel_num}: offset = NaN, omitido")
+        elif verbose:
+            print(f"   [WARNING] Canal {channel_num}: sin datos válidos, omitido")
 
 
 def process_run_complete(filename: str, logfile, config: dict, 
@@ -370,7 +476,8 @@ def process_run_complete(filename: str, logfile, config: dict,
     # 1. Validar keywords
     from .filtering import should_exclude_run
     if should_exclude_run(filename, exclude_keywords):
-        print(f"[WARNING] Run '{filename}' excluido por keywords")
+        if is_verbose(config):
+            print(f"[WARNING] Run '{filename}' excluido por keywords")
         run = Run(filename)
         run.is_valid = False
         return run
@@ -383,7 +490,8 @@ def process_run_complete(filename: str, logfile, config: dict,
     
     # 4. Si es inválido, retornar sin calcular offsets
     if not run.is_valid:
-        print(f"[WARNING] Run '{filename}' marcado como BAD en logfile")
+        if is_verbose(config):
+            print(f"[WARNING] Run '{filename}' marcado como BAD en logfile")
         return run
     
     # 5. Calcular offsets entre canales
@@ -8,8 +8,12 @@ Funciones:
 - create_multiple_calibsets(): Crea múltiples sets
 """
 
+import csv
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 from typing import Union, Optional, List, Dict, TYPE_CHECKING
 
@@ -18,6 +22,18 @@ if TYPE_CHECKING:
     from ..run import Run
     from ..sensor import Sensor
 
+# Directorio de resultados por defecto (data/results del repo)
+_RESULTS_DIR = Path(__file__).parents[2] / "data" / "results"
+
+# Columnas del CSV de un set (export_calibset_to_csv)
+_CALIBSET_CSV_COLUMNS = ('set_number', 'sensor_id', 'mean_offset', 'std_offset', 'n_runs', 'reference_id')
+
+
+@lru_cache(maxsize=None)
+def _default_calibset_csv_path(set_number: float) -> Path:
+    """Ruta por defecto del CSV de un set (calibset_{N}.csv), construida una vez por set."""
+    return _RESULTS_DIR / f"calibset_{int(set_number)}.csv"
+
 
 def calculate_set_statistics(calib_set, runs: list['Run']) -> tuple[Dict['Sensor', float], Dict['Sensor', float]]:
     """
@@ -37,70 +53,88 @@ def calculate_set_statistics(calib_set, runs: list['Run']) -> tuple[Dict['Sensor
         sensors[0] = canal 1, sensors[1] = canal 2, etc.
         Así que sensor = calib_set.sensors[canal - 1]
     """
-    if not runs:
+    # Salida temprana: sin runs con offsets (o sin sensores) no hay nada que
+    # reducir, y se evita reservar y recorrer matrices vacías
+    if not runs or not calib_set.sensors or not any(run.offsets for run in runs):
         return {}, {}
     
-    # Recopilar offsets y errores por sensor (traduciendo desde canales)
-    offsets_by_sensor = {}  # {sensor: [offset1, offset2, ...]}
-    errors_by_sensor = {}   # {sensor: [error1, error2, ...]}
-    
-    # Recorrer todos los runs válidos para recopilar datos
-    for run in runs:
-        # run.offsets es un dict {canal: offset}
-        # Necesitamos traducirlo a {sensor: offset} usando la lista de sensores
-        for channel, offset in run.offsets.items():
-            # El canal 1 corresponde a sensors[0], canal 2 a sensors[1], etc.
-            if channel < 1 or channel > len(calib_set.sensors):
-                continue  # Canal fuera de rango, ignorar
-            
-            # Obtener el objeto Sensor que corresponde a este canal
-            sensor = calib_set.sensors[channel - 1]  # canal 1 está en índice 0
-            
-            # Inicializar listas para este sensor si es la primera vez
-            if sensor not in offsets_by_sensor:
-                offsets_by_sensor[sensor] = []
-                errors_by_sensor[sensor] = []
-            
-            # Agregar offset y error de este run para este sensor
-            offsets_by_sensor[sensor].append(offset)
-            error = run.offset_errors.get(channel, 0.0)
-            errors_by_sensor[sensor].append(error)
+    n_sensors = len(calib_set.sensors)
     
-    # Inicializar diccionarios de resultados
-    mean_offsets = {}
-    std_offsets = {}
+    # Matrices (run, canal) con offsets y errores traducidos desde canales.
+    # Fila k = runs[k], columna i = canal i+1 = sensors[i]. NaN = sin dato.
+    # float32: la precisión (~7 cifras) sobra para offsets de mK y reduce a la
+    # mitad la memoria recorrida en las reducciones; se acumula en float64.
+    offsets_array = np.full((len(runs), n_sensors), np.nan, dtype=np.float32)
+    errors_array = np.full((len(runs), n_sensors), np.nan, dtype=np.float32)
     
-    # Calcular media ponderada y error propagado para cada sensor
-    for sensor in offsets_by_sensor.keys():
-        offsets = np.array(offsets_by_sensor[sensor])
-        errors = np.array(errors_by_sensor[sensor])
-        
-        # Caso especial: si solo hay un offset disponible, usarlo directamente
-        if len(offsets) == 1:
-            mean_offsets[sensor] = offsets[0]
-            std_offsets[sensor] = errors[0] if errors[0] > 0 else 0.0
+    # Recorrer todos los runs válidos para rellenar las matrices (una fila por run)
+    for k, run in enumerate(runs):
+        n_channels = len(run.offsets)
+        if n_channels == 0:
             continue
         
-        # Si todos los errores son 0, usar media aritmética simple
-        if np.all(errors == 0):
-            mean_offsets[sensor] = np.mean(offsets)
-            std_offsets[sensor] = 0.0
-            continue
-        
-        # Reemplazar errores=0 con un valor pequeño para evitar división por 0
-        errors_safe = np.where(errors == 0, 1e-10, errors)
-        
-        # Pesos: w_i = 1 / σ_i²
-        weights = 1.0 / (errors_safe ** 2)
+        # run.offsets es un dict {canal: offset}: se vuelca a arrays de una vez
+        channels = np.fromiter(run.offsets.keys(), dtype=np.intp, count=n_channels)
+        offsets = np.fromiter(run.offsets.values(), dtype=np.float64, count=n_channels)
+        errors = np.fromiter(
+            (run.offset_errors.get(channel, 0.0) for channel in run.offsets),
+            dtype=np.float64, count=n_channels
+        )
         
-        # Media ponderada: μ = Σ(w_i * x_i) / Σ(w_i)
-        weighted_mean = np.sum(weights * offsets) / np.sum(weights)
+        # El canal 1 corresponde a sensors[0], canal 2 a sensors[1], etc.
+        # Canales fuera de rango se ignoran
+        in_range = (channels >= 1) & (channels <= n_sensors)
+        columns = channels[in_range] - 1
+        offsets_array[k, columns] = offsets[in_range]
+        errors_array[k, columns] = errors[in_range]
+    
+    # Celdas con dato utilizable. calculate_run_offsets solo guarda offsets
+    # finitos y su error siempre es finito, así que basta con mirar los offsets
+    # (ambas matrices tienen NaN exactamente en las mismas celdas).
+    mask_valid = ~np.isnan(offsets_array)
+    if not mask_valid.any():
+        # Ningún canal de ningún run cae en el rango de sensores del set
+        return {}, {}
+    
+    # Número de runs con dato para cada sensor
+    n_values = np.count_nonzero(mask_valid, axis=0)
+    
+    # Pesos: w_i = 1 / σ_i², 0 donde no hay dato (sin NaN que propagar).
+    # Errores=0 se reemplazan por un valor pequeño para evitar división por 0.
+    # La máscara se aplica dentro de la propia división (where=): las celdas sin
+    # dato no se calculan y conservan el 0 inicial, sin pasadas extra de np.where.
+    zero_err = errors_array == 0  # se reutiliza para el caso "todos los errores 0"
+    safe_err = np.where(zero_err, np.float32(1e-10), errors_array)
+    weights = np.zeros_like(offsets_array)
+    np.divide(1.0, safe_err * safe_err, out=weights, where=mask_valid)
+    offsets_clean = np.where(mask_valid, offsets_array, 0.0)
+    sum_weights = np.sum(weights, axis=0, dtype=np.float64)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Media ponderada: μ = Σ(w_i * x_i) / Σ(w_i). El numerador se reduce con
+        # einsum (producto y suma fusionados, sin la matriz temporal w·x)
+        weighted_sum = np.einsum('ki,ki->i', offsets_clean, weights, dtype=np.float64)
+        weighted_mean = weighted_sum / sum_weights
         
         # Error propagado: σ = 1 / √(Σ(w_i))
-        propagated_error = 1.0 / np.sqrt(np.sum(weights))
+        propagated_error = 1.0 / np.sqrt(sum_weights)
         
-        mean_offsets[sensor] = weighted_mean
-        std_offsets[sensor] = propagated_error
+        # Si todos los errores son 0, usar media aritmética simple (error 0).
+        # Cubre también el caso de un único offset con error 0.
+        # La media simple (una reducción más) solo se calcula si algún sensor lo necesita.
+        all_zero = ~np.any(mask_valid & ~zero_err, axis=0) & (n_values > 0)
+        if all_zero.any():
+            simple_mean = np.sum(offsets_clean, axis=0, dtype=np.float64) / n_values
+            weighted_mean = np.where(all_zero, simple_mean, weighted_mean)
+            propagated_error = np.where(all_zero, 0.0, propagated_error)
+    
+    # Inicializar diccionarios de resultados (solo sensores con al menos un dato)
+    # Los valores se convierten a float de Python en bloque (tolist) y se
+    # recorren con zip, sin indexar ni convertir escalares numpy uno a uno
+    with_data = np.flatnonzero(n_values)
+    sensors_with_data = [calib_set.sensors[i] for i in with_data]
+    mean_offsets = dict(zip(sensors_with_data, weighted_mean[with_data].tolist()))
+    std_offsets = dict(zip(sensors_with_data, propagated_error[with_data].tolist()))
     
     # Forzar referencia a offset=0, std=0 (primer sensor, canal 1)
     reference_sensor = calib_set.sensors[0] if calib_set.sensors else None
@@ -138,8 +172,8 @@ def create_calibration_set(
     std_offsets = {}
     
     # 2. Obtener configuración del set
-    sets_config = config.get('sensors', {}).get('sets', {})
-    set_config = sets_config.get(str(set_number), sets_config.get(set_number, {}))
+    from .config import get_set_config
+    set_config = get_set_config(config, set_number) or {}
     
     if not set_config:
         print(f"[WARNING] Set {set_number} no encontrado en config")
@@ -184,11 +218,16 @@ def create_calibration_set(
     
     # 6. Procesar cada run y agregarlo a la lista
     from .run_utils import process_run_complete
+    
+    # Filas del logfile de este set, extraídas una vez: cada run busca su fila
+    # entre unas pocas entradas en lugar de recorrer el logfile completo
+    set_logfile = logfile[logfile["Filename"].isin(valid_filenames)]
+    
     runs = []
     for filename in valid_filenames:
         run = process_run_complete(
             filename=filename,
-            logfile=logfile,
+            logfile=set_logfile,
             config=config,
             set_number=set_number,
             reference_channel=reference_channel,  # Cambio: usar canal en lugar de sensor ID
@@ -258,79 +297,109 @@ def export_calibset_to_csv(
     
     # Ruta por defecto
     if output_path is None:
-        repo_root = Path(__file__).parents[2]
-        results_dir = repo_root / "data" / "results"
-        results_dir.mkdir(parents=True, exist_ok=True)
-        output_path = results_dir / f"calibset_{int(calib_set.set_number)}.csv"
+        output_path = _default_calibset_csv_path(calib_set.set_number)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
     else:
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Crear DataFrame
-    rows = []
-    for sensor in sorted(mean_offsets.keys(), key=lambda s: s.id):
-        rows.append({
-            'set_number': calib_set.set_number,
-            'sensor_id': sensor.id,
-            'mean_offset': mean_offsets[sensor],
-            'std_offset': std_offsets.get(sensor, 0.0),
-            'n_runs': n_runs,
-            'reference_id': reference_id
-        })
-    
-    df = pd.DataFrame(rows)
-    
-    # Guardar CSV
-    df.to_csv(output_path, index=False)
+    # Escribir filas directamente al CSV (sin DataFrame ni lista intermedia)
+    sensors = sorted(mean_offsets.keys(), key=lambda s: s.id)
+    n_rows = len(sensors)
+    set_number = calib_set.set_number
+    
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(_CALIBSET_CSV_COLUMNS)
+        writer.writerows(
+            (set_number, s.id, mean_offsets[s], std_offsets.get(s, 0.0), n_runs, reference_id)
+            for s in sensors
+        )
     
     print(f"[OK] CalibSet {calib_set.set_number} exportado → {output_path}")
-    print(f"  Sensores: {len(rows)}")
+    print(f"  Sensores: {n_rows}")
     print(f"  Runs usados: {n_runs}")
     
     return str(output_path)
 
 
+def _create_calibration_set_safe(set_number, logfile: pd.DataFrame, config: dict) -> tuple:
+    """
+    Ejecuta create_calibration_set capturando errores.
+    
+    Función de módulo (serializable) para poder ejecutarse en procesos hijos.
+    
+    Returns:
+        tuple: (resultado de create_calibration_set o None, mensaje de error o None)
+    """
+    try:
+        return create_calibration_set(set_number=set_number, logfile=logfile, config=config), None
+    except Exception as e:
+        return None, str(e)
+
+
 def create_multiple_calibsets(
     set_numbers: Union[List[Union[int, float]], str],
     logfile: pd.DataFrame,
-    config: dict
+    config: dict,
+    max_workers: Optional[int] = None
 ) -> Dict[float, tuple]:
     """
     Crea múltiples CalibSets de una vez.
     
+    Args:
+        set_numbers: Lista de sets o 'all' para todos los del config
+        logfile: DataFrame con LogFile.csv
+        config: Diccionario de configuración
+        max_workers: Procesos en paralelo (None o 1 = secuencial). Los sets son
+            independientes (ficheros y resultados disjuntos), así que se pueden
+            repartir entre núcleos; la salida por pantalla puede intercalarse
+    
     Returns:
         Dict[float, tuple]: {set_number: (calib_set, mean_offsets, std_offsets)}
     """
     # Si set_numbers es 'all', obtener todos del config
     if isinstance(set_numbers, str) and set_numbers.lower() == 'all':
-        sets_config = config.get('sensors', {}).get('sets', {})
-        set_numbers = sorted([float(k) for k in sets_config.keys()])
+        from .config import get_sets_config
+        set_numbers = sorted(get_sets_config(config).keys())
     
     print("=" * 70)
     print(f"CREANDO {len(set_numbers)} CALIBSETS")
     print("=" * 70)
     
+    # Normalizar CalibSetNumber una sola vez para todos los sets
+    from .filtering import normalize_set_numbers
+    logfile = normalize_set_numbers(logfile)
+    
     calibsets = {}
     success_count = 0
     
-    for set_num in set_numbers:
-        try:
+    parallel = max_workers is not None and max_workers > 1 and len(set_numbers) > 1
+    executor = ProcessPoolExecutor(max_workers=max_workers) if parallel else None
+    try:
+        # Resultados en el mismo orden que set_numbers; en modo secuencial map es
+        # perezoso y cada set se procesa al pedirlo dentro del bucle
+        mapper = executor.map if executor is not None else map
+        outcomes = mapper(_create_calibration_set_safe, set_numbers, repeat(logfile), repeat(config))
+        
+        for set_num in set_numbers:
             print(f"\n[{success_count + 1}/{len(set_numbers)}] Set {set_num}:")
             
-            calib_set, mean_offsets, std_offsets = create_calibration_set(
-                set_number=set_num,
-                logfile=logfile,
-                config=config
-            )
+            result, error = next(outcomes)
+            if error is not None:
+                print(f"  [FAIL] Error procesando set {set_num}: {error}")
+                continue
+            
+            calib_set, mean_offsets, std_offsets = result
             
             if mean_offsets:
                 calibsets[float(set_num)] = (calib_set, mean_offsets, std_offsets)
                 success_count += 1
             else:
                 print(f"  [FAIL] Set {set_num} no tiene offsets válidos")
-                
-        except Exception as e:
-            print(f"  [FAIL] Error procesando set {set_num}: {e}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
     print(f"\n[OK] Completado: {success_count}/{len(set_numbers)} sets procesados exitosamente")
     return calibsets
@@ -9,10 +9,12 @@ Funciones principales:
 - create_tree_from_calibsets(): Construye Tree completo desde calibsets
 """
 
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 import sys
 from pathlib import Path
 
+import numpy as np
+
 # Importar desde el módulo padre
 parent_dir = Path(__file__).parent.parent
 if str(parent_dir) not in sys.path:
@@ -22,15 +24,20 @@ from tree_entry import TreeEntry
 from tree import Tree
 from calibset import CalibSet
 from sensor import Sensor
+from utils.config import get_sets_config
+
+# Config vacía compartida para sets que no aparecen en config.yml (solo lectura)
+_NO_SET_CONFIG: dict = {}
 
 
-def find_parent_sets(target_entry: TreeEntry, all_entries: List[TreeEntry], parent_set_id: Optional[float] = None) -> List[TreeEntry]:
+def find_parent_sets(target_entry: TreeEntry, all_entries: Union[List[TreeEntry], Dict[float, TreeEntry]], parent_set_id: Optional[float] = None) -> List[TreeEntry]:
     """
     Encuentra el parent de un entry basándose en parent_set del config.
     
     Args:
         target_entry: Entry a analizar
-        all_entries: Lista de todos los entries
+        all_entries: Lista de todos los entries, o dict {set_number: TreeEntry}
+            (ej: tree.entries) para un lookup O(1) sin recorrer la lista
         parent_set_id: ID del parent_set desde config (opcional)
     
     Returns:
@@ -41,6 +48,10 @@ def find_parent_sets(target_entry: TreeEntry, all_entries: List[TreeEntry], pare
         return []
     
     # Buscar el entry que corresponda al parent_set_id
+    if isinstance(all_entries, dict):
+        parent = all_entries.get(parent_set_id)
+        return [parent] if parent is not None else []
+    
     for entry in all_entries:
         if entry.set_number == parent_set_id:
             return [entry]
@@ -63,8 +74,6 @@ def calculate_offsets_to_raised(
     Returns:
         Dict {raised_sensor: {sensor: (offset, error)}}
     """
-    from utils.math_utils import propagate_error
-    
     # Diccionario que almacenará los resultados: {raised_sensor: {sensor: (offset, error)}}
     offsets_to_raised = {}
     
@@ -73,10 +82,40 @@ def calculate_offsets_to_raised(
     calibset_errors = calibset.std_offsets    # {sensor_id: error}
     reference_id = calibset.reference_sensors[0].id if calibset.reference_sensors else None
     
+    # Sensores candidatos: se resuelven UNA vez (no por cada raised).
+    # Se excluyen aquí los descartados y los que no tienen offset, de modo que el
+    # bucle por raised solo recorre sensores válidos con su (offset, error) ya leído.
+    # Offsets y errores se escriben directamente en arrays preasignados (como
+    # máximo un hueco por sensor del set) y se recortan al final.
+    discarded = set(tree_entry.discarded_sensors)
+    set_sensors = tree_entry.calibset.sensors
+    cand_sensors = []
+    cand_offsets = np.empty(len(set_sensors), dtype=np.float64)
+    cand_errors = np.empty(len(set_sensors), dtype=np.float64)
+    for sensor in set_sensors:
+        # Saltar sensores descartados (defectuosos o inválidos)
+        if sensor in discarded:
+            continue
+        
+        # Obtener offset del sensor respecto a la referencia interna del set
+        if sensor.id == reference_id:
+            offset, error = 0.0, 0.0
+        elif sensor.id in calibset_offsets:
+            offset, error = calibset_offsets[sensor.id], calibset_errors.get(sensor.id, 0.0)
+        else:
+            # Si el sensor no tiene offset, fue omitido en todos los runs (sin datos válidos)
+            continue
+        
+        k = len(cand_sensors)
+        cand_sensors.append(sensor)
+        cand_offsets[k] = offset
+        cand_errors[k] = error
+    
+    cand_offsets = cand_offsets[:len(cand_sensors)]
+    cand_errors = cand_errors[:len(cand_sensors)]
+    
     # Procesar cada raised sensor disponible en este entry
     for raised_sensor in tree_entry.raised_sensors:
-        offsets_to_raised[raised_sensor] = {}
-        
         # Obtener offset del raised respecto a la referencia interna del set
         # Si el raised ES la referencia, su offset es 0
         if raised_sensor.id == reference_id:
@@ -88,38 +127,25 @@ def calculate_offsets_to_raised(
             raised_error = calibset_errors.get(raised_sensor.id, 0.0)
         else:
             # Si el raised no tiene offset calculado, hay un problema
+            # (se mantiene su clave, sin offsets, como en el resto del tree)
             print(f"  Warning: Raised {raised_sensor.id} no tiene offset en CalibSet {tree_entry.set_number}")
+            offsets_to_raised[raised_sensor] = {}
             continue
         
-        # Para cada sensor del set, calcular su offset respecto a este raised
-        for sensor in tree_entry.calibset.sensors:
-            # Saltar sensores descartados (defectuosos o inválidos)
-            if sensor in tree_entry.discarded_sensors:
-                continue
-            
-            # No calcular offset de un sensor consigo mismo (sería 0 siempre)
-            # Nota: se cambió el 19/01/26 para evitar caminos triviales
-            if sensor == raised_sensor:
-                continue
-
-            # Obtener offset del sensor respecto a la referencia interna del set
-            if sensor.id == reference_id:
-                sensor_offset = 0.0
-                sensor_error = 0.0
-            elif sensor.id in calibset_offsets:
-                sensor_offset = calibset_offsets[sensor.id]
-                sensor_error = calibset_errors.get(sensor.id, 0.0)
-            else:
-                # Si el sensor no tiene offset, fue omitido en todos los runs (sin datos válidos)
-                continue
+        # Cambio de base de referencia para todos los candidatos a la vez:
+        # offset(sensor → raised) = offset(sensor → ref) - offset(raised → ref)
+        # error = sqrt(error_sensor² + error_raised²)
+        offsets_vec = cand_offsets - raised_offset
+        errors_vec = np.sqrt(cand_errors * cand_errors + raised_error * raised_error)
 
-            # Cambio de base de referencia:
-            # offset(sensor → raised) = offset(sensor → ref) - offset(raised → ref)
-            offset_to_raised = sensor_offset - raised_offset
-            error_to_raised = propagate_error(sensor_error, raised_error)
-
-            # Guardar el offset calculado
-            offsets_to_raised[raised_sensor][sensor] = (offset_to_raised, error_to_raised)
+        # No guardar el offset de un sensor consigo mismo (sería 0 siempre)
+        # Nota: se cambió el 19/01/26 para evitar caminos triviales
+        # Los arrays se convierten a float de Python en bloque (tolist), no escalar a escalar
+        offsets_to_raised[raised_sensor] = {
+            sensor: (offset, error)
+            for sensor, offset, error in zip(cand_sensors, offsets_vec.tolist(), errors_vec.tolist())
+            if sensor != raised_sensor
+        }
     
     return offsets_to_raised
 
@@ -133,7 +159,7 @@ def calculate_raised_sensors(entry: TreeEntry, general_references: List[int]) ->
     
     Args:
         entry: TreeEntry a analizar
-        general_references: Lista de IDs de referencias generales (ej: [48176, 48177])
+        general_references: IDs de referencias generales (lista o set, ej: {48176, 48177})
     
     Returns:
         Lista de Sensor objects que son raised
@@ -145,20 +171,20 @@ def calculate_raised_sensors(entry: TreeEntry, general_references: List[int]) ->
     # Obtener lista de sensores del set actual
     current_sensors = entry.calibset.sensors
     
-    # Obtener sensores del parent (asumimos que solo hay un parent)
+    # IDs de sensores del parent (asumimos que solo hay un parent), resueltos
+    # una vez como set para que cada comprobación sea O(1)
     parent = entry.parent_entries[0]
-    parent_sensors = parent.calibset.sensors
+    parent_ids = {sensor.id for sensor in parent.calibset.sensors}
     
-    # Buscar sensores que están en ambos sets (current y parent)
-    raised_sensors = []
-    for sensor in current_sensors:
-        # No incluir las referencias generales del experimento
-        if sensor.id in general_references:
-            continue
-        
-        # Si el sensor aparece en el parent, es un raised
-        if sensor in parent_sensors:
-            raised_sensors.append(sensor)
+    # Referencias generales como set (no-op si ya lo son)
+    general_refs = general_references if isinstance(general_references, (set, frozenset)) else set(general_references)
+    
+    # Raised: sensores que están en ambos sets (current y parent),
+    # sin incluir las referencias generales del experimento
+    raised_sensors = [
+        sensor for sensor in current_sensors
+        if sensor.id in parent_ids and sensor.id not in general_refs
+    ]
     
     return raised_sensors
 
@@ -169,18 +195,17 @@ def build_tree_hierarchy(tree: Tree, sets_config: dict):
     
     Args:
         tree: Tree con entries
-        sets_config: Configuración de sets (para parent_set)
+        sets_config: Configuración de sets con claves float (get_sets_config)
     """
-    all_entries = list(tree.entries.values())
     # Recorrer cada entry para establecer sus relaciones parent-child
-    for entry in all_entries:
+    for entry in tree.entries.values():
         # Buscar el parent_set definido en la configuración para este set
-        set_config = sets_config.get(float(entry.set_number), {})
+        set_config = sets_config.get(entry.set_number, _NO_SET_CONFIG)
         parent_set_id = set_config.get('parent_set', None)
         
         # Si tiene parent_set definido, establecer la conexión
         if parent_set_id is not None:
-            parents = find_parent_sets(entry, all_entries, parent_set_id)
+            parents = find_parent_sets(entry, tree.entries, parent_set_id)
             for parent in parents:
                 entry.add_parent(parent)  # Conectar el entry con su parent
                 parent.add_child(entry)   # Conectar el parent con este entry (bidireccional)
@@ -203,16 +228,17 @@ def create_tree_from_calibsets(
         Tree completo
     """
     tree = Tree()
-    sets_config = config.get('sensors', {}).get('sets', {})
+    # Config de sets con claves float, normalizada una vez para todos los pasos
+    sets_config = get_sets_config(config)
     
     print(f"Construyendo Tree desde {len(calibsets)} CalibSets...")
     
     # Paso 1: Crear TreeEntry para cada CalibSet con solo discarded desde config
     for set_number, calibset in calibsets.items():
-        set_config = sets_config.get(float(set_number), {})
+        set_config = sets_config.get(set_number, _NO_SET_CONFIG)
         
-        # Extraer solo discarded desde config
-        discarded_ids = set_config.get('discarded', [])
+        # Extraer solo discarded desde config (set: pertenencia O(1) por sensor)
+        discarded_ids = set(set_config.get('discarded') or [])
         
         # Mapear IDs a objetos Sensor
         discarded_sensors = [s for s in calibset.sensors if s.id in discarded_ids]
@@ -235,12 +261,9 @@ def create_tree_from_calibsets(
     print("\nCalculando raised sensors automáticamente...")
     
     # Obtener referencias generales del config (aparecen en 'reference' de los sets)
-    general_references = set()
-    for set_cfg in sets_config.values():
-        refs = set_cfg.get('reference', [])
-        general_references.update(refs)
-    general_references = list(general_references)
-    print(f"  Referencias generales excluidas: {general_references}")
+    # (una sola unión en C sobre las listas 'reference' de todos los sets)
+    general_references = set().union(*(set_cfg.get('reference') or () for set_cfg in sets_config.values()))
+    print(f"  Referencias generales excluidas: {sorted(general_references)}")
     
     all_entries = list(tree.entries.values())
     for entry in all_entries: